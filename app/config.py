@@ -19,5 +19,37 @@ class Settings(BaseSettings):
     TOKEN_EXPIRE_MINUTES: int = 60
     LLM_API_KEY: Optional[str] = None
     LLM_API_ENDPOINT: Optional[str] = None
+    SUGGESTION_TOP_K: int = 50  # Suggestions precomputed and stored per user
+    SUGGESTION_BATCH_WORKERS: Optional[int] = None  # Defaults to the CPU count
+    SUGGESTION_BATCH_INTERVAL_MINUTES: Optional[int] = None  # Run the batch in-process when set
+    DOMAIN_TAXONOMY_PATH: Optional[str] = None  # JSON {domain: [keywords]} overriding the built-in taxonomy
+    DOMAIN_TAXONOMY_RELOAD_SECONDS: int = 30  # How often to check the taxonomy file for changes
+    SUGGESTION_ENGINE: str = "exact"  # "exact" (inverted tag index) or "minhash" (approximate LSH)
+    MINHASH_INDEX_PATH: Optional[str] = None  # Directory of the prebuilt MinHash index
+    MINHASH_NUM_PERM: int = 128  # Signature length; with MINHASH_BANDS sets the recall curve
+    MINHASH_BANDS: int = 64  # More bands (fewer rows each) favour recall over latency
+    MINHASH_MAX_CANDIDATES: int = 2000  # Candidates rescored exactly per query
+    SUGGESTION_CACHE_ENABLED: bool = True  # Read-through cache in front of on-demand suggestions
+    SUGGESTION_CACHE_TTL_SECONDS: int = 300  # Upper bound on entry lifetime; tag changes invalidate sooner
+    SUGGESTION_CACHE_MAX_ENTRIES: int = 10000  # Least recently used entries are evicted past this
+    REALTIME_QUEUE_SIZE: int = 100  # Undelivered events per WebSocket before it is dropped with a resync hint
+    USER_CACHE_TTL_SECONDS: int = 60  # How long a recipient's cached role/status may lag behind other workers
+    USER_CACHE_MAX_ENTRIES: int = 10000
+    CONVERSATION_CACHE_MAX_ENTRIES: int = 50000  # Cached participant pair -> conversation id lookups
+    BROADCAST_CHUNK_SIZE: int = 1000  # Recipients per INSERT ... RETURNING batch in admin broadcasts
+    MESSAGE_ARCHIVE_AFTER_DAYS: int = 365  # Messages older than this are moved out of the messages table
+    MESSAGE_ARCHIVE_DIR: str = "archive/messages"  # Root of the local archive store
+    MESSAGE_ARCHIVE_CHUNK_SIZE: int = 1000  # Messages per compressed archive chunk
+    MESSAGE_ARCHIVE_CACHE_CHUNKS: int = 64  # Decompressed chunks kept in memory for history paging
+    IDEMPOTENCY_CACHE_TTL_SECONDS: int = 600  # Retries within this window skip the database entirely
+    IDEMPOTENCY_CACHE_MAX_ENTRIES: int = 50000
+    FEED_WINDOW_DAYS: int = 14  # Only posts this recent are feed candidates
+    FEED_FANOUT_MAX_AUDIENCE: int = 5000  # Larger audiences are served by fan-out on read instead
+    FEED_CANDIDATES: int = 500  # Pushed candidates ranked per feed read
+    FEED_PULL_CANDIDATES: int = 200  # Fan-out-on-read posts ranked per feed read
+    FEED_SUGGESTION_BOOST: float = 0.5  # Weight of the author's suggestion score in a post's feed score
+    FEED_HALF_LIFE_HOURS: float = 48  # A post's feed score halves every this many hours
+    POST_PAGE_CACHE_ENABLED: bool = True  # Serve repeated GET /posts/ pages from serialized responses
+    POST_PAGE_CACHE_TTL_SECONDS: int = 30  # Bounds staleness on other workers after a post is created or deleted
 
 settings = Settings()
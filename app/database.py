@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import Table, create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 from .config import settings
 
@@ -6,6 +6,26 @@ engine = create_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+def ensure_table_schema(table: Table) -> None:
+    """Add columns and indexes a model gained after its table was created.
+
+    create_all skips tables that already exist, so deployments need this for
+    every column added to an existing table. Added columns are nullable, and
+    rows from before the upgrade hold NULL in them.
+    """
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as connection:
+        for column in table.columns:
+            if column.name not in existing:
+                connection.execute(text(
+                    f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} "
+                    f"{column.type.compile(dialect=engine.dialect)}"
+                ))
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
 def get_db():
     """Dependency to get the database session."""
     db = SessionLocal()
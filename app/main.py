@@ -1,10 +1,25 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import auth, users, admin, posts, messages, resume, suggestions
-from .database import Base, engine
+from .database import Base, engine, ensure_table_schema
+from .models.messages import Message
+from .models.posts import Post
+from .models.suggestion import Suggestion
+from .models.tag_index import UserTagProfile
+from .config import settings
+from .services.suggestion_batch import SuggestionScheduler
+from .services.minhash_index import get_minhash_index
+from .services.realtime import hub as realtime_hub
+from .services.search_service import ensure_search_schema
 
 # Create the database tables
 Base.metadata.create_all(bind=engine)
+# Columns and indexes added to tables that predate them
+ensure_table_schema(Message.__table__)
+ensure_table_schema(Post.__table__)
+ensure_table_schema(Suggestion.__table__)
+ensure_table_schema(UserTagProfile.__table__)
+ensure_search_schema(engine)
 
 app = FastAPI(
     title="Connect - Alumni Student Platform",
@@ -30,6 +45,41 @@ app.include_router(messages.router)
 app.include_router(resume.router)
 app.include_router(suggestions.router)
 
+# Optional in-process suggestion batch; deployments can run the CLI from cron instead
+suggestion_scheduler = (
+    SuggestionScheduler(settings.SUGGESTION_BATCH_INTERVAL_MINUTES)
+    if settings.SUGGESTION_BATCH_INTERVAL_MINUTES
+    else None
+)
+
+
+@app.on_event("startup")
+async def start_suggestion_scheduler():
+    if suggestion_scheduler:
+        suggestion_scheduler.start()
+
+
+@app.on_event("startup")
+async def load_minhash_index():
+    # Map the prebuilt index at worker startup instead of on the first request
+    get_minhash_index()
+
+
+@app.on_event("startup")
+async def start_realtime_hub():
+    await realtime_hub.start()
+
+
+@app.on_event("shutdown")
+async def stop_realtime_hub():
+    await realtime_hub.stop()
+
+
+@app.on_event("shutdown")
+async def stop_suggestion_scheduler():
+    if suggestion_scheduler:
+        suggestion_scheduler.stop()
+
 
 @app.get("/")
 async def root():
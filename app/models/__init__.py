@@ -1,6 +1,11 @@
 from .users import User, UserRole, UserStatus
 from .profiles import Profile
 from .otp import OTPLog
-from .posts import Post
+from .posts import Post, PostTag
+from .feed import FeedItem, FeedPullPost
 from .messages import Message
+from .conversations import Conversation, InboxCounter, RequestStatus
+from .broadcasts import BroadcastJob
+from .archives import MessageArchive
 from .resume import ResumeData
+from .tag_index import UserTag, UserTagProfile
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from sqlalchemy.sql import func
+from ..database import Base
+
+
+class MessageArchive(Base):
+    """Manifest entry for one compressed chunk of a conversation's archived messages."""
+
+    __tablename__ = "message_archives"
+
+    archive_id = Column(Integer, primary_key=True)
+    conversation_id = Column(String, nullable=False)
+    object_key = Column(String, nullable=False, unique=True)  # Key of the chunk in the archive store
+    # (timestamp, message_id) range of the chunk's messages, both ends included
+    first_timestamp = Column(DateTime(timezone=True), nullable=False)
+    first_message_id = Column(Integer, nullable=False)
+    last_timestamp = Column(DateTime(timezone=True), nullable=False)
+    last_message_id = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Finds the chunks next to a history cursor, in either direction
+        Index("idx_message_archive_range", conversation_id, last_timestamp, last_message_id),
+    )
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, JSON, ForeignKey, DateTime
+from sqlalchemy.sql import func
+from ..database import Base
+
+
+class BroadcastJob(Base):
+    """An admin message sent to every user matching a filter, delivered in chunks in the background."""
+
+    __tablename__ = "broadcast_jobs"
+
+    job_id = Column(String, primary_key=True)
+    sender_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    content = Column(String, nullable=False)
+    filters = Column(JSON, nullable=False, default=dict)  # role / status / course / year_of_study
+    status = Column(String, nullable=False, default="pending")  # pending, running, completed, failed
+    total = Column(Integer, nullable=False, default=0)  # Recipients matched by the filters
+    sent = Column(Integer, nullable=False, default=0)  # Messages stored so far
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
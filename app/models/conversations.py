@@ -0,0 +1,65 @@
+from sqlalchemy import Column, Integer, String, Enum, ForeignKey, DateTime, Index
+from sqlalchemy.sql import func
+from ..database import Base
+import enum
+
+
+class RequestStatus(str, enum.Enum):
+    PENDING = "pending"
+    ACCEPTED = "accepted"
+    DECLINED = "declined"
+
+
+class Conversation(Base):
+    """One row per pair of users who have messaged each other, maintained on every send."""
+
+    __tablename__ = "conversations"
+
+    conversation_id = Column(String, primary_key=True)  # Same id as messages.conversation_id
+    # Participants in canonical order (user_low_id < user_high_id), so each pair has one row
+    user_low_id = Column(
+        Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False
+    )
+    user_high_id = Column(
+        Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False
+    )
+    last_message_id = Column(
+        Integer, ForeignKey("messages.message_id", ondelete="SET NULL"), nullable=True
+    )
+    last_activity = Column(DateTime(timezone=True), server_default=func.now())
+    unread_low = Column(Integer, nullable=False, default=0)  # Messages user_low_id hasn't read
+    unread_high = Column(Integer, nullable=False, default=0)  # Messages user_high_id hasn't read
+    # Set when a student opens the conversation with a message request to an alumnus
+    request_status = Column(Enum(RequestStatus), nullable=True)
+    request_recipient_id = Column(
+        Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=True
+    )
+    # Sort key of the newest archived message; older history lives in message_archives
+    archived_through_timestamp = Column(DateTime(timezone=True), nullable=True)
+    archived_through_message_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("idx_conversation_pair", user_low_id, user_high_id, unique=True),
+        # Inbox listing per participant, most recent first
+        Index("idx_conversation_low_activity", user_low_id, last_activity.desc()),
+        Index("idx_conversation_high_activity", user_high_id, last_activity.desc()),
+        # Pending requests per recipient, most recent first
+        Index(
+            "idx_conversation_request_inbox",
+            request_recipient_id,
+            request_status,
+            last_activity.desc(),
+        ),
+    )
+
+
+class InboxCounter(Base):
+    """Per-user counters kept up to date by the messaging service, so reading them is one primary-key lookup."""
+
+    __tablename__ = "inbox_counters"
+
+    user_id = Column(
+        Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True
+    )
+    pending_requests = Column(Integer, nullable=False, default=0)  # Conversations with request_status pending
@@ -0,0 +1,39 @@
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, Index
+from ..database import Base
+
+
+class FeedItem(Base):
+    """A recent post pushed into one user's feed candidate set when it was created (fan-out on write)."""
+
+    __tablename__ = "feed_items"
+
+    user_id = Column(
+        Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True
+    )
+    post_id = Column(
+        Integer, ForeignKey("posts.post_id", ondelete="CASCADE"), primary_key=True
+    )
+    created_at = Column(DateTime(timezone=True), nullable=False)  # Copy of the post's
+
+    # A user's candidates, newest first
+    __table_args__ = (
+        Index("idx_feed_item_user_created", user_id, created_at.desc()),
+    )
+
+
+class FeedPullPost(Base):
+    """A post whose audience was too large to fan out; feeds pull it in when they are read (fan-out on read)."""
+
+    __tablename__ = "feed_pull_posts"
+
+    post_id = Column(
+        Integer, ForeignKey("posts.post_id", ondelete="CASCADE"), primary_key=True
+    )
+    user_id = Column(
+        Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False
+    )  # Author
+    created_at = Column(DateTime(timezone=True), nullable=False)  # Copy of the post's
+
+    __table_args__ = (
+        Index("idx_feed_pull_created", created_at.desc()),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..database import Base
@@ -14,6 +14,7 @@ class Message(Base):
     conversation_id = Column(String, nullable=True, index=True)  # Optional grouping
     is_request = Column(Boolean, default=False)  # For student-initiated requests
     timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    idempotency_key = Column(String, nullable=True)  # Client-supplied key; a retried send reuses it
 
     sender = relationship(
         "User", foreign_keys=[sender_id], back_populates="sent_messages"
@@ -21,3 +22,13 @@ class Message(Base):
     recipient = relationship(
         "User", foreign_keys=[recipient_id], back_populates="received_messages"
     )
+
+    # Fetch the server-side timestamp in the INSERT itself rather than a refresh
+    __mapper_args__ = {"eager_defaults": True}
+
+    __table_args__ = (
+        # Serves conversation history in (timestamp, message_id) keyset order, both directions
+        Index("idx_message_conversation_time", conversation_id, timestamp, message_id),
+        # At most one message per sender and idempotency key (NULL keys never collide)
+        Index("idx_message_sender_idempotency", sender_id, idempotency_key, unique=True),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, JSON, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, JSON, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..database import Base
@@ -14,3 +14,28 @@ class Post(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     user = relationship("User", back_populates="posts")
+
+    # Fetch the server-side created_at in the INSERT itself, for the post's PostTag rows
+    __mapper_args__ = {"eager_defaults": True}
+
+    __table_args__ = (
+        # Serves the feed in (created_at, post_id) keyset order, newest first
+        Index("idx_post_created", created_at.desc(), post_id.desc()),
+    )
+
+
+class PostTag(Base):
+    """One row per tag of a post, so tag filters and counts use an index instead of the JSON tags column."""
+
+    __tablename__ = "post_tags"
+
+    post_id = Column(
+        Integer, ForeignKey("posts.post_id", ondelete="CASCADE"), primary_key=True
+    )
+    tag = Column(String, primary_key=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)  # Copy of the post's, for feed order
+
+    # Posts with a tag, newest first; tag counts read only the leading column
+    __table_args__ = (
+        Index("idx_post_tag_created", tag, created_at.desc(), post_id.desc()),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime, Index, String
+from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime, Index, String, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..database import Base
@@ -12,9 +12,15 @@ class Suggestion(Base):
     suggested_user_id = Column(Integer, ForeignKey("users.user_id"), index=True)
     similarity_score = Column(Float, nullable=False)
     domain = Column(String, nullable=True)  # Domain of the suggestion (e.g., "technical", "academic", "professional")
+    matching_tags = Column(JSON, nullable=True)  # Tags shared in the primary domain
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )  # When the score was last computed
 
     # Create a composite index for faster lookups
     __table_args__ = (
         Index('idx_user_suggested', user_id, suggested_user_id, unique=True),
-    )
\ No newline at end of file
+        # Serves ranked reads and (score, user id) keyset pagination
+        Index('idx_user_score', user_id, similarity_score.desc(), suggested_user_id),
+    )
@@ -0,0 +1,38 @@
+from sqlalchemy import Column, Integer, String, JSON, ForeignKey, DateTime, Index
+from sqlalchemy.sql import func
+from ..database import Base
+
+
+class UserTag(Base):
+    """Inverted index from a tag to the users whose posts or profile carry it."""
+
+    __tablename__ = "user_tags"
+
+    user_tag_id = Column(Integer, primary_key=True, index=True)
+    tag = Column(String, nullable=False)
+    user_id = Column(
+        Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False, index=True
+    )
+
+    # Lookups go tag -> users, so the tag leads the composite index
+    __table_args__ = (
+        Index("idx_tag_user", tag, user_id, unique=True),
+    )
+
+
+class UserTagProfile(Base):
+    """Materialized tag profile of a user, maintained incrementally on post/profile changes."""
+
+    __tablename__ = "user_tag_profiles"
+
+    user_id = Column(
+        Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True
+    )
+    tag_counts = Column(JSON, nullable=False, default=dict)  # tag -> number of posts/profile entries carrying it
+    domain_tags = Column(JSON, nullable=False, default=dict)  # domain -> sorted list of tags
+    tag_count = Column(Integer, nullable=False, default=0)  # Number of distinct tags
+    suggestions_computed_at = Column(DateTime(timezone=True), nullable=True)  # Last time top-K suggestions were stored
+    suggestions_top_k = Column(Integer, nullable=True)  # K of that computation; fewer stored rows means no more candidates
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
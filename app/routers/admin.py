@@ -1,13 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List
 from ..database import get_db
 from ..schemas.users import User as UserSchema
-from ..schemas.messages import MessageCreate, Message
+from ..schemas.messages import MessageCreate, Message, BroadcastCreate, BroadcastJob as BroadcastJobSchema
 from ..models.users import User, UserStatus
-from ..models.messages import Message as MessageModel
-from ..utils.auth import get_current_admin
-import uuid
+from ..utils.auth import get_current_admin, invalidate_cached_user
+from ..models.broadcasts import BroadcastJob
+from ..services import message_service
+from ..services.archive_service import delete_user_archives
+from ..services.broadcast_service import create_broadcast, run_broadcast
+from ..services.realtime import publish_message
+from ..services.suggestion_service import invalidate_user_suggestions, suggestion_cache_stats
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -42,6 +46,7 @@ async def approve_user(
 
     user.status = UserStatus.ACTIVE
     db.commit()
+    message_service.invalidate_user_access(user_id)
     db.refresh(user)
     return user
 
@@ -59,11 +64,22 @@ async def delete_user(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
+    invalidate_user_suggestions(db, user_id)
+    message_service.release_pending_requests(db, user_id)
+    delete_user_archives(db, user_id)
     db.delete(user)
     db.commit()
+    message_service.invalidate_user_access(user_id)
+    invalidate_cached_user(user.email)
     return {"message": "User deleted successfully"}
 
 
+@router.get("/suggestion-cache")
+async def get_suggestion_cache_stats(current_admin: User = Depends(get_current_admin)):
+    """Get hit, miss and eviction counters for the suggestion cache."""
+    return suggestion_cache_stats()
+
+
 @router.post("/message", response_model=Message)
 async def send_admin_message(
     message: MessageCreate,
@@ -72,45 +88,53 @@ async def send_admin_message(
 ):
     """Send a message from admin to a user."""
     # Check if recipient exists
-    recipient = db.query(User).filter(User.user_id == message.recipient_id).first()
-    if not recipient:
+    if not message_service.get_user_access(db, message.recipient_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Recipient not found"
         )
 
-    # Generate a conversation ID if not exists
-    # Check for existing conversation between these users
-    existing_conversation = (
-        db.query(MessageModel)
-        .filter(
-            (
-                (MessageModel.sender_id == current_admin.user_id)
-                & (MessageModel.recipient_id == message.recipient_id)
-            )
-            | (
-                (MessageModel.sender_id == message.recipient_id)
-                & (MessageModel.recipient_id == current_admin.user_id)
-            )
-        )
-        .first()
+    new_message = message_service.send_message(
+        db, current_admin.user_id, message.recipient_id, message.content, is_request=False
     )
+    await publish_message(new_message)
+    return new_message
 
-    conversation_id = (
-        existing_conversation.conversation_id
-        if existing_conversation
-        else str(uuid.uuid4())
-    )
 
-    # Create message
-    new_message = MessageModel(
-        sender_id=current_admin.user_id,
-        recipient_id=message.recipient_id,
-        content=message.content,
-        conversation_id=conversation_id,
-        is_request=False,
+@router.post(
+    "/broadcast", response_model=BroadcastJobSchema, status_code=status.HTTP_202_ACCEPTED
+)
+async def broadcast_message(
+    broadcast: BroadcastCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_admin: User = Depends(get_current_admin),
+):
+    """Send a message from admin to every user matching the filters, in the background."""
+    job = create_broadcast(
+        db,
+        current_admin.user_id,
+        broadcast.content,
+        {
+            "role": broadcast.role,
+            "status": broadcast.status,
+            "course": broadcast.course,
+            "year_of_study": broadcast.year_of_study,
+        },
     )
+    background_tasks.add_task(run_broadcast, job.job_id)
+    return job
 
-    db.add(new_message)
-    db.commit()
-    db.refresh(new_message)
-    return new_message
+
+@router.get("/broadcast/{job_id}", response_model=BroadcastJobSchema)
+async def get_broadcast(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_admin: User = Depends(get_current_admin),
+):
+    """Get the progress of a broadcast."""
+    job = db.query(BroadcastJob).filter(BroadcastJob.job_id == job_id).first()
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Broadcast not found"
+        )
+    return job
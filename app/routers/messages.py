@@ -1,146 +1,340 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, WebSocket, WebSocketDisconnect, status
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
-from typing import List, Dict
-import uuid
-from ..database import get_db
-from ..schemas.messages import MessageCreate, Message, MessageWithUsers
-from ..models.messages import Message as MessageModel
+import asyncio
+from typing import List, Dict, Optional
+from datetime import datetime
+from ..database import SessionLocal, get_db
+from ..schemas.messages import (
+    MessageCreate,
+    MessageBatchCreate,
+    Message,
+    MessageWithUsers,
+    MessageSearchResult,
+    ConversationSummary,
+    MessagePage,
+    MessageRequestList,
+)
+from ..models.conversations import Conversation
+from ..services import message_service
+from ..services.realtime import hub, publish_message
+from ..services.search_service import search_messages
 from ..models.users import User, UserRole, UserStatus
-from ..utils.auth import get_current_user
+from ..utils.auth import get_current_user, get_user_from_token
+from ..utils.pagination import decode_cursor, encode_cursor
 
 router = APIRouter(prefix="/messages", tags=["Messages"])
 
+conversations_adapter = TypeAdapter(Dict[str, List[MessageWithUsers]])
+
 
 def can_message(sender_role: str, recipient_role: str) -> bool:
     """Check if the sender is allowed to message the recipient based on roles."""
-    allowed_combinations = [
-        (UserRole.ALUMNI, UserRole.STUDENT),
-        (UserRole.STUDENT, UserRole.ALUMNI),
-        (UserRole.STUDENT, UserRole.MENTOR),
-        (UserRole.MENTOR, UserRole.STUDENT),
-        (UserRole.ALUMNI, UserRole.MENTOR),
-        (UserRole.MENTOR, UserRole.ALUMNI),
-        (UserRole.MENTOR, UserRole.MENTOR),
-        (UserRole.ADMIN, UserRole.STUDENT),
-        (UserRole.ADMIN, UserRole.ALUMNI),
-        (UserRole.ADMIN, UserRole.MENTOR),
-        (UserRole.STUDENT, UserRole.ADMIN),
-        (UserRole.ALUMNI, UserRole.ADMIN),
-        (UserRole.MENTOR, UserRole.ADMIN),
-    ]
-
-    return (sender_role, recipient_role) in allowed_combinations
+    return (sender_role, recipient_role) in message_service.MESSAGE_PERMISSIONS
 
 
-@router.post("/", response_model=Message)
-async def send_message(
-    message: MessageCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
-):
-    """Send a message to another user."""
+def check_can_message(db: Session, sender: User, recipient_id: int) -> bool:
+    """Raise unless the sender may message the recipient; returns whether the message is a request."""
     # Check if recipient exists and is active
-    recipient = (
-        db.query(User)
-        .filter(User.user_id == message.recipient_id, User.status == UserStatus.ACTIVE)
-        .first()
-    )
+    recipient_access = message_service.get_user_access(db, recipient_id)
 
-    if not recipient:
+    if not recipient_access or recipient_access[1] != UserStatus.ACTIVE:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Recipient not found or not active",
         )
+    recipient_role = recipient_access[0]
 
     # Check if messaging is allowed between these roles
-    if not can_message(current_user.role, recipient.role):
+    if not can_message(sender.role, recipient_role):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Messaging not allowed between these roles",
         )
 
     # For student-initiated messages to alumni, mark as request
-    is_request = (
-        current_user.role == UserRole.STUDENT and recipient.role == UserRole.ALUMNI
-    )
-    if is_request:
-        message.is_request = True
-
-    # Check for existing conversation
-    existing_conversation = (
-        db.query(MessageModel)
-        .filter(
-            (
-                (MessageModel.sender_id == current_user.user_id)
-                & (MessageModel.recipient_id == message.recipient_id)
+    return sender.role == UserRole.STUDENT and recipient_role == UserRole.ALUMNI
+
+
+@router.post("/", response_model=Message)
+async def send_message(
+    message: MessageCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(
+        None, max_length=255, description="Client-generated key; retries with the same key store the message once"
+    ),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Send a message to another user."""
+    is_request = check_can_message(db, current_user, message.recipient_id)
+
+    try:
+        if idempotency_key:
+            new_message, created = message_service.send_message_once(
+                db, current_user.user_id, message.recipient_id, message.content, is_request, idempotency_key
             )
-            | (
-                (MessageModel.sender_id == message.recipient_id)
-                & (MessageModel.recipient_id == current_user.user_id)
+        else:
+            new_message = message_service.send_message(
+                db, current_user.user_id, message.recipient_id, message.content, is_request
             )
+            created = True
+    except PermissionError as e:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    if created:
+        await publish_message(new_message)
+    else:
+        response.headers["Idempotent-Replayed"] = "true"
+    return new_message
+
+
+@router.post("/batch", response_model=List[Message])
+async def send_messages(
+    batch: MessageBatchCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Send several messages, to one or more users, in one transaction: either all are stored or none."""
+    items = [
+        (
+            message.recipient_id,
+            message.content,
+            check_can_message(db, current_user, message.recipient_id),
+            message.idempotency_key,
         )
-        .first()
+        for message in batch.messages
+    ]
+    try:
+        results = message_service.send_messages(db, current_user.user_id, items)
+    except PermissionError as e:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    for new_message, created in results:
+        if created:
+            await publish_message(new_message)
+    return [new_message for new_message, _ in results]
+
+
+@router.get("/inbox", response_model=List[ConversationSummary])
+async def get_inbox(
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of conversations to return"),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Get the current user's conversations, most recently active first, with unread counts."""
+    return message_service.get_inbox(db, current_user.user_id, limit, offset)
+
+
+@router.get("/requests", response_model=MessageRequestList)
+async def get_message_requests(
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of requests to return"),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Get the message requests waiting for the current user's answer, most recent first."""
+    return MessageRequestList(
+        pending_count=message_service.get_pending_request_count(db, current_user.user_id),
+        requests=message_service.get_message_requests(db, current_user.user_id, limit, offset),
     )
 
-    conversation_id = (
-        existing_conversation.conversation_id
-        if existing_conversation
-        else str(uuid.uuid4())
+
+@router.post("/requests/{conversation_id}/accept")
+async def accept_message_request(
+    conversation_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Accept a message request, turning it into an ordinary conversation."""
+    conversation = get_participant_conversation(db, conversation_id, current_user)
+    if not message_service.respond_to_request(db, conversation, current_user.user_id, accept=True):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No message request to accept",
+        )
+    return {"message": "Message request accepted"}
+
+
+@router.post("/requests/{conversation_id}/decline")
+async def decline_message_request(
+    conversation_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Decline a pending message request; the sender can't message again until it is accepted."""
+    conversation = get_participant_conversation(db, conversation_id, current_user)
+    if not message_service.respond_to_request(db, conversation, current_user.user_id, accept=False):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No pending message request to decline",
+        )
+    return {"message": "Message request declined"}
+
+
+@router.get("/search", response_model=List[MessageSearchResult])
+async def search(
+    q: str = Query(..., min_length=1, description="Search terms"),
+    conversation_id: Optional[str] = Query(None, description="Only search this conversation"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Search the messages the current user sent or received, best match first."""
+    return search_messages(db, current_user.user_id, q, limit, offset, conversation_id)
+
+
+def get_participant_conversation(db: Session, conversation_id: str, user: User) -> Conversation:
+    """Return the conversation if the user takes part in it, 404 otherwise."""
+    conversation = message_service.find_conversation(db, conversation_id)
+    if not conversation or user.user_id not in (
+        conversation.user_low_id,
+        conversation.user_high_id,
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found"
+        )
+    return conversation
+
+
+@router.get("/conversations/{conversation_id}", response_model=MessagePage)
+async def get_conversation_history(
+    conversation_id: str,
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of messages to return"),
+    before: Optional[str] = Query(None, description="Cursor for the page of older messages"),
+    after: Optional[str] = Query(None, description="Cursor for the page of newer messages"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Get one page of a conversation's messages in chronological order, latest page by default."""
+    if before and after:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Pass only one of before and after",
+        )
+    conversation = get_participant_conversation(db, conversation_id, current_user)
+
+    messages, has_more = message_service.get_history(
+        db,
+        conversation,
+        limit,
+        before=decode_cursor(before, datetime, int) if before else None,
+        after=decode_cursor(after, datetime, int) if after else None,
     )
 
-    # Create new message
-    new_message = MessageModel(
-        sender_id=current_user.user_id,
-        recipient_id=message.recipient_id,
-        content=message.content,
-        conversation_id=conversation_id,
-        is_request=message.is_request,
+    names = dict(
+        db.query(User.user_id, User.name).filter(
+            User.user_id.in_((conversation.user_low_id, conversation.user_high_id))
+        )
+    )
+    page = MessagePage(
+        messages=[
+            MessageWithUsers(
+                message_id=message.message_id,
+                sender_id=message.sender_id,
+                recipient_id=message.recipient_id,
+                content=message.content,
+                conversation_id=message.conversation_id,
+                is_request=message.is_request,
+                timestamp=message.timestamp,
+                sender_name=names.get(message.sender_id, ""),
+                recipient_name=names.get(message.recipient_id, ""),
+            )
+            for message in messages
+        ]
     )
+    if messages:
+        first, last = messages[0], messages[-1]
+        # Older messages exist unless this page was read backwards and came up short
+        if after or has_more:
+            page.before_cursor = encode_cursor(first.timestamp, first.message_id)
+        # Always returned, so clients can poll for messages newer than the page
+        page.after_cursor = encode_cursor(last.timestamp, last.message_id)
+    else:
+        page.after_cursor = after
+    return page
 
-    db.add(new_message)
-    db.commit()
-    db.refresh(new_message)
-    return new_message
+
+@router.post("/conversations/{conversation_id}/read")
+async def mark_conversation_read(
+    conversation_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Mark every message in a conversation as read for the current user."""
+    conversation = get_participant_conversation(db, conversation_id, current_user)
+    message_service.mark_conversation_read(db, conversation, current_user.user_id)
+    return {"message": "Conversation marked as read"}
 
 
 @router.get("/conversations", response_model=Dict[str, List[MessageWithUsers]])
 async def get_conversations(
-    db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+    last_n: Optional[int] = Query(
+        None, ge=1, le=100, description="Only return the last N messages of each conversation"
+    ),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
 ):
     """Get all conversations for the current user."""
-    # Get all messages where user is sender or recipient
-    messages = (
-        db.query(
-            MessageModel,
-            User.name.label("sender_name"),
-            User.name.label("recipient_name"),
-        )
-        .join(User, MessageModel.sender_id == User.user_id)
-        .filter(
-            (MessageModel.sender_id == current_user.user_id)
-            | (MessageModel.recipient_id == current_user.user_id)
-        )
-        .order_by(MessageModel.timestamp.asc())
-        .all()
+    # Group the row tuples by conversation_id, then validate and serialize the whole
+    # response in one pass instead of building a model per message in Python
+    fields = message_service.USER_MESSAGE_FIELDS
+    conversations: Dict[str, List[dict]] = {}
+    for row in message_service.get_user_messages(db, current_user.user_id, last_n):
+        conversations.setdefault(row.conversation_id, []).append(dict(zip(fields, row)))
+
+    return Response(
+        content=conversations_adapter.dump_json(conversations_adapter.validate_python(conversations)),
+        media_type="application/json",
     )
 
-    # Group messages by conversation_id
-    conversations = {}
-    for message, sender_name, recipient_name in messages:
-        if message.conversation_id not in conversations:
-            conversations[message.conversation_id] = []
-
-        message_dict = {
-            "message_id": message.message_id,
-            "sender_id": message.sender_id,
-            "recipient_id": message.recipient_id,
-            "content": message.content,
-            "conversation_id": message.conversation_id,
-            "is_request": message.is_request,
-            "timestamp": message.timestamp,
-            "sender_name": sender_name,
-            "recipient_name": recipient_name,
-        }
-        conversations[message.conversation_id].append(message_dict)
-
-    return conversations
+
+@router.websocket("/ws")
+async def message_stream(websocket: WebSocket, token: str = Query(...)):
+    """Push new messages to the connected user as they are sent.
+
+    Events are JSON objects: {"type": "message", "message": {...}} for each message the
+    user sends or receives, and {"type": "resync"} just before the server closes a
+    connection that fell behind; the client should reconnect and catch up from history.
+    """
+    db = SessionLocal()
+    try:
+        user_id = get_user_from_token(token, db).user_id
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    finally:
+        db.close()
+
+    await websocket.accept()
+    connection = hub.connect(user_id)
+
+    async def write():
+        while True:
+            event = await connection.queue.get()
+            await websocket.send_json(event)
+            if connection.dropped and connection.queue.empty():
+                await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+                return
+
+    async def read():
+        # Nothing is expected from the client; reading only notices the disconnect
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    tasks = [asyncio.create_task(write()), asyncio.create_task(read())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        hub.disconnect(connection)
@@ -1,19 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Response, status
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from datetime import datetime
 from ..database import get_db
-from ..schemas.posts import PostCreate, Post, PostWithUser
+from ..schemas.posts import PostCreate, Post, PostWithUser, PostSearchResult, FeedPost, TagCount
 from ..models.posts import Post as PostModel
 from ..models.users import User, UserStatus
-from ..utils.auth import get_current_user, get_current_admin
-from sqlalchemy import or_
+from ..utils.auth import get_current_user, get_current_user_id, get_current_admin
+from ..services import feed_service, post_service
+from ..services.suggestion_service import update_tag_profile
+from ..utils.pagination import decode_cursor, encode_cursor
 
 router = APIRouter(prefix="/posts", tags=["Posts"])
 
+posts_adapter = TypeAdapter(List[PostWithUser])
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches the ETag (weak comparison, as for GET)."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in (candidate.removeprefix("W/") for candidate in candidates)
+
 
 @router.post("/", response_model=Post, status_code=status.HTTP_201_CREATED)
 async def create_post(
     post: PostCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
@@ -23,51 +38,94 @@ async def create_post(
     )
 
     db.add(new_post)
+    post_service.add_post_tags(db, new_post)
+    update_tag_profile(db, current_user.user_id, added=post.tags)
+    post_service.invalidate_post_pages(db)
     db.commit()
     db.refresh(new_post)
+    background_tasks.add_task(feed_service.fan_out_post, new_post.post_id)
     return new_post
 
 
 @router.get("/", response_model=List[PostWithUser])
 async def get_posts(
     keyword: Optional[str] = None,
-    field: Optional[str] = None,
+    field: Optional[str] = Query(None, description="Only posts with this tag (same as a single `tags`)"),
+    tags: Optional[List[str]] = Query(None, description="Only posts with these tags; repeat for several"),
+    match: str = Query("all", pattern="^(all|any)$", description="Whether posts need all of `tags` or any"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of posts to return"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    """Get posts with optional filtering."""
-    query = db.query(
-        PostModel, User.name.label("user_name"), User.role.label("user_role")
-    ).join(User)
+    """Get one page of posts, most recent first, with optional filtering.
+
+    When more posts follow, the X-Next-Cursor response header holds the cursor for the next page.
+    Responses carry an ETag; send it back in If-None-Match to get 304 Not Modified while the page is unchanged.
+    """
+    tags = (tags or []) + ([field] if field else [])
+    # Taken before the query, so a post committed meanwhile can't be cached under the newer version
+    cache_key = post_service.page_cache_key(limit, cursor, keyword, tags, match)
+    page = post_service.get_cached_page(cache_key)
+    if page is None:
+        rows, has_more = post_service.get_posts_page(
+            db,
+            limit,
+            before=decode_cursor(cursor, datetime, int) if cursor else None,
+            keyword=keyword,
+            tags=tags,
+            match=match,
+        )
+
+        # Validate and serialize the row tuples in one pass instead of building a model per post
+        fields = post_service.POST_FIELDS
+        posts = posts_adapter.validate_python([dict(zip(fields, row)) for row in rows])
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].post_id) if has_more else None
+        page = post_service.cache_page(cache_key, posts_adapter.dump_json(posts), next_cursor)
 
-    # Apply filters
-    if keyword:
-        query = query.filter(PostModel.content.ilike(f"%{keyword}%"))
+    headers = {"ETag": page["etag"]}
+    if page["next_cursor"]:
+        headers["X-Next-Cursor"] = page["next_cursor"]
+    if etag_matches(if_none_match, page["etag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=page["body"], media_type="application/json", headers=headers)
 
-    if field:
-        # This assumes tags are stored as an array in PostgreSQL
-        query = query.filter(PostModel.tags.contains([field]))
 
-    # Order by most recent first
-    query = query.order_by(PostModel.created_at.desc())
+@router.get("/feed", response_model=List[FeedPost])
+async def get_feed(
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of posts to return"),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Get recent posts ranked for the current user by shared interests, suggested connections and recency."""
+    return feed_service.get_feed(db, current_user.user_id, limit, offset)
+
 
-    results = query.all()
+@router.get("/tags", response_model=List[TagCount])
+async def get_tag_counts(
+    tags: Optional[List[str]] = Query(None, description="Only count posts with these tags"),
+    match: str = Query("all", pattern="^(all|any)$"),
+    prefix: Optional[str] = Query(None, description="Only tags starting with this"),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Get the number of posts per tag, most used first, optionally within a tag filter."""
+    return post_service.get_tag_counts(db, tags, match, prefix, limit)
 
-    # Convert results to response format
-    posts = []
-    for post, user_name, user_role in results:
-        post_dict = {
-            "post_id": post.post_id,
-            "user_id": post.user_id,
-            "content": post.content,
-            "tags": post.tags,
-            "created_at": post.created_at,
-            "user_name": user_name,
-            "user_role": user_role,
-        }
-        posts.append(post_dict)
 
-    return posts
+@router.get("/search", response_model=List[PostSearchResult])
+async def search_posts(
+    q: str = Query(..., min_length=1, description="Search terms"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Search posts by content, best match first, with highlighted snippets."""
+    return post_service.search_posts(db, q, limit, offset)
 
 
 @router.delete("/{post_id}")
@@ -90,6 +148,11 @@ async def delete_post(
             detail="Not authorized to delete this post",
         )
 
+    post_service.delete_post_tags(db, post_id)
+    post_service.unindex_post(db, post_id, post.content)
+    feed_service.remove_post(db, post_id)
     db.delete(post)
+    update_tag_profile(db, post.user_id, removed=post.tags)
+    post_service.invalidate_post_pages(db)
     db.commit()
     return {"message": "Post deleted successfully"}
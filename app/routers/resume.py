@@ -8,6 +8,7 @@ from ..models.users import User
 from ..utils.auth import get_current_user
 from ..services.file_service import FileService
 from ..services.llm_service import LLMService
+from ..services.suggestion_service import update_tag_profile
 
 router = APIRouter(prefix="/resume", tags=["Resume"])
 
@@ -75,8 +76,15 @@ async def upload_resume(
     # Update user profile with extracted fields
     profile = db.query(Profile).filter(Profile.user_id == current_user.user_id).first()
     if profile and "interests" in fields_extracted.get("extracted_fields", {}):
+        previous_interests = profile.fields_of_interest
         profile.fields_of_interest = fields_extracted["extracted_fields"]["interests"]
         profile.resume_url = file_path
+        update_tag_profile(
+            db,
+            current_user.user_id,
+            added=profile.fields_of_interest,
+            removed=previous_interests,
+        )
         db.commit()
 
     return resume_data
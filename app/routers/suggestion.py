@@ -1,8 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from typing import List, Dict
+from typing import List, Dict, Optional
+from ..config import settings
 from ..database import get_db
-from ..services.suggestion_service import generate_suggestions, get_domain_suggestions
+from ..services.suggestion_service import (
+    count_stored_suggestions,
+    generate_suggestions,
+    get_cached_domain_suggestions,
+    get_cached_suggestions,
+    get_stored_suggestions,
+    get_stored_top_k,
+)
 from ..schemas.suggestion import SuggestionResponse, DomainSuggestionResponse
 
 router = APIRouter(
@@ -15,10 +23,38 @@ router = APIRouter(
 def get_suggestions(
     user_id: int, 
     limit: int = Query(10, description="Maximum number of suggestions to return"),
+    max_age_minutes: Optional[int] = Query(None, description="Recompute if the stored suggestions are older than this"),
+    after_score: Optional[float] = Query(None, description="Similarity score of the last suggestion on the previous page"),
+    after_user_id: Optional[int] = Query(None, description="User id of the last suggestion on the previous page"),
     db: Session = Depends(get_db)
 ):
-    """Get suggestions for a user based on similar interests"""
-    suggestions = generate_suggestions(db, user_id, limit)
+    """Get suggestions for a user based on similar interests, paginated by (score, user id) cursor"""
+    if (after_score is None) != (after_user_id is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="after_score and after_user_id must be given together",
+        )
+    
+    suggestions = None
+    # The stored list is whatever K the last computation used (batch --top-k may differ from the setting)
+    stored_top_k = get_stored_top_k(db, user_id)
+    if stored_top_k is not None:
+        suggestions = get_stored_suggestions(
+            db, user_id, limit, max_age_minutes, after_score, after_user_id
+        )
+        # A short page that reaches the end of a cut-off stored top-K continues on demand
+        if (
+            suggestions is not None
+            and len(suggestions) < limit
+            and count_stored_suggestions(db, user_id) >= stored_top_k
+        ):
+            suggestions = None
+    if suggestions is None:
+        if after_score is not None:
+            suggestions = generate_suggestions(db, user_id, limit, after_score, after_user_id)
+        else:
+            # Never computed (or stale): compute the full top-K once so later reads hit the table
+            suggestions = get_cached_suggestions(db, user_id, max(limit, settings.SUGGESTION_TOP_K))[:limit]
     
     if not suggestions:
         return []
@@ -41,10 +77,22 @@ def get_suggestions(
 def get_suggestions_by_domain(
     user_id: int,
     limit_per_domain: int = Query(5, description="Maximum number of suggestions per domain"),
+    max_age_minutes: Optional[int] = Query(None, description="Recompute if the stored suggestions are older than this"),
     db: Session = Depends(get_db)
 ):
     """Get suggestions for a user organized by domain"""
-    domain_suggestions = get_domain_suggestions(db, user_id, limit_per_domain)
+    # Stored rows can only be bucketed when they hold every candidate; a truncated
+    # top-K would underfill sparse domains, so those users are ranked per domain
+    stored_top_k = get_stored_top_k(db, user_id)
+    stored = get_stored_suggestions(db, user_id, stored_top_k, max_age_minutes) if stored_top_k else None
+    if stored is not None and len(stored) < stored_top_k:
+        domain_suggestions = {}
+        for user, score, domain, matching_tags in stored:
+            bucket = domain_suggestions.setdefault(domain, [])
+            if len(bucket) < limit_per_domain:
+                bucket.append((user, score, matching_tags))
+    else:
+        domain_suggestions = get_cached_domain_suggestions(db, user_id, limit_per_domain)
     
     if not domain_suggestions:
         return {}
@@ -64,4 +112,4 @@ def get_suggestions_by_domain(
             for user, score, matching_tags in suggestions
         ]
     
-    return result
\ No newline at end of file
+    return result
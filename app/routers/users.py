@@ -9,6 +9,7 @@ from ..models.users import User, UserStatus, UserRole
 from ..models.profiles import Profile
 from ..utils.auth import get_current_user
 from ..services.file_service import FileService
+from ..services.suggestion_service import update_tag_profile
 from ..config import settings
 
 router = APIRouter(prefix="/users", tags=["Users"])
@@ -87,6 +88,7 @@ async def register_user(
         resume_url=resume_path,
     )
     db.add(profile)
+    update_tag_profile(db, new_user.user_id, added=fields_list)
     db.commit()
 
     if new_user.role == UserRole.ADMIN:
@@ -125,9 +127,19 @@ async def update_profile(
         )
 
     # Update profile fields
-    for key, value in profile_update.dict(exclude_unset=True).items():
+    previous_interests = profile.fields_of_interest
+    updates = profile_update.dict(exclude_unset=True)
+    for key, value in updates.items():
         setattr(profile, key, value)
 
+    if "fields_of_interest" in updates:
+        update_tag_profile(
+            db,
+            current_user.user_id,
+            added=profile.fields_of_interest,
+            removed=previous_interests,
+        )
+
     db.commit()
     db.refresh(profile)
     return profile
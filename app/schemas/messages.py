@@ -1,6 +1,8 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from datetime import datetime
+from ..models.conversations import RequestStatus
+from ..models.users import UserRole, UserStatus
 
 
 class MessageBase(BaseModel):
@@ -12,6 +14,14 @@ class MessageCreate(MessageBase):
     recipient_id: int
 
 
+class MessageBatchItem(MessageCreate):
+    idempotency_key: Optional[str] = Field(None, max_length=255)
+
+
+class MessageBatchCreate(BaseModel):
+    messages: List[MessageBatchItem] = Field(..., min_length=1, max_length=100)
+
+
 class Message(MessageBase):
     message_id: int
     sender_id: int
@@ -26,3 +36,49 @@ class Message(MessageBase):
 class MessageWithUsers(Message):
     sender_name: str
     recipient_name: str
+
+
+class ConversationSummary(BaseModel):
+    conversation_id: str
+    other_user_id: int
+    other_user_name: str
+    last_message_id: Optional[int] = None
+    last_activity: Optional[datetime] = None
+    unread_count: int
+    request_status: Optional[RequestStatus] = None
+
+
+class MessageRequestList(BaseModel):
+    pending_count: int  # All pending requests, not just this page
+    requests: List[ConversationSummary]
+
+
+class MessageSearchResult(MessageWithUsers):
+    rank: float
+
+
+class MessagePage(BaseModel):
+    messages: List[MessageWithUsers]
+    before_cursor: Optional[str] = None  # Pass as `before` for older messages; None when there are none
+    after_cursor: Optional[str] = None  # Pass as `after` for newer messages
+
+
+class BroadcastCreate(BaseModel):
+    content: str
+    role: Optional[UserRole] = None
+    status: Optional[UserStatus] = UserStatus.ACTIVE
+    course: Optional[str] = None
+    year_of_study: Optional[str] = None
+
+
+class BroadcastJob(BaseModel):
+    job_id: str
+    status: str
+    total: int
+    sent: int
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -24,3 +24,17 @@ class Post(PostBase):
 class PostWithUser(Post):
     user_name: str
     user_role: str
+
+
+class PostSearchResult(PostWithUser):
+    rank: float
+    snippet: str  # Excerpt around the matches, with matched words in <b></b>
+
+
+class FeedPost(PostWithUser):
+    score: float  # Interest overlap and suggestion boost, decayed by age
+
+
+class TagCount(BaseModel):
+    tag: str
+    count: int
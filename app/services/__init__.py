@@ -1,7 +0,0 @@
-from .users import User, UserRole, UserStatus
-from .profiles import Profile
-from .posts import Post
-from .messages import Message
-from .resume import ResumeData
-from .otp import OTP
-from .suggestion import Suggestion
\ No newline at end of file
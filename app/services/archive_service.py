@@ -0,0 +1,330 @@
+"""
+Archival of old messages into compressed, per-conversation cold storage.
+
+Messages older than MESSAGE_ARCHIVE_AFTER_DAYS are written oldest first, up to
+MESSAGE_ARCHIVE_CHUNK_SIZE per chunk, as gzip-compressed JSON Lines objects to an
+ArchiveStore (local disk by default; a blob store only has to implement the same
+three methods). Each chunk is recorded in message_archives and its messages are
+deleted from messages in the same transaction.
+
+A conversation's latest message is never archived, so its inbox entry keeps
+pointing at a stored row, and every archived message sorts before every message
+still in the table. History paging (message_service.get_history) therefore only
+reads the archive once it walks past the oldest hot message. Archived messages
+no longer appear in /messages/conversations or in search.
+
+Deleting a user deletes the archived chunks of every conversation they took
+part in (delete_user_archives), manifest rows first and store objects once that
+commits.
+
+Conversations must exist in the conversations table; run the conversation
+backfill first, then archive from cron with:
+    python -m app.services.archive_service --older-than-days 365
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+from sqlalchemy import event, or_, select
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import SessionLocal
+from ..models.archives import MessageArchive
+from ..models.conversations import Conversation
+from ..models.messages import Message
+from .cache import InProcessCache
+from ..utils.pagination import keyset_after, keyset_before, sort_key
+
+logger = logging.getLogger(__name__)
+
+# Fields stored per archived message, in column order
+ARCHIVE_FIELDS = (
+    "message_id",
+    "sender_id",
+    "recipient_id",
+    "content",
+    "conversation_id",
+    "is_request",
+    "timestamp",
+)
+
+
+class ArchiveStore:
+    """Blob storage for archive chunks, addressed by '/'-separated keys."""
+
+    def put(self, key: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    def get(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class LocalArchiveStore(ArchiveStore):
+    """Stores chunks as files under a root directory."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so a reader never sees a partial chunk
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as chunk_file:
+            chunk_file.write(data)
+            chunk_file.flush()
+            os.fsync(chunk_file.fileno())
+        os.replace(temporary_path, path)
+
+    def get(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as chunk_file:
+            return chunk_file.read()
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+_store: Optional[ArchiveStore] = None
+
+# object key -> decoded rows; chunks never change once written
+_chunk_cache = InProcessCache(max_entries=settings.MESSAGE_ARCHIVE_CACHE_CHUNKS)
+
+
+def get_archive_store() -> ArchiveStore:
+    global _store
+    if _store is None:
+        _store = LocalArchiveStore(settings.MESSAGE_ARCHIVE_DIR)
+    return _store
+
+
+def set_archive_store(store: ArchiveStore) -> None:
+    """Swap the archive store, e.g. for a blob store shared by every worker"""
+    global _store
+    _store = store
+    _chunk_cache.clear()
+
+
+def encode_chunk(rows) -> bytes:
+    """gzip-compressed JSON Lines, one message per line in ARCHIVE_FIELDS"""
+    lines = []
+    for row in rows:
+        record = dict(zip(ARCHIVE_FIELDS, row))
+        record["timestamp"] = record["timestamp"].isoformat()
+        lines.append(json.dumps(record, separators=(",", ":")))
+    return gzip.compress("\n".join(lines).encode())
+
+
+def decode_chunk(data: bytes) -> List[dict]:
+    rows = []
+    for line in gzip.decompress(data).decode().splitlines():
+        record = json.loads(line)
+        record["timestamp"] = datetime.fromisoformat(record["timestamp"])
+        rows.append(record)
+    return rows
+
+
+def _load_chunk(object_key: str) -> List[dict]:
+    rows = _chunk_cache.get(object_key)
+    if rows is None:
+        rows = decode_chunk(get_archive_store().get(object_key))
+        _chunk_cache.set(object_key, rows)
+    return rows
+
+
+def read_archived_messages(
+    db: Session,
+    conversation_id: str,
+    limit: int,
+    before: Optional[Tuple[datetime, int]] = None,
+    after: Optional[Tuple[datetime, int]] = None,
+) -> List[Message]:
+    """Up to `limit` archived messages next to a (timestamp, message_id) cursor, in chronological order.
+
+    With `after`, the oldest archived messages after it; otherwise the newest ones
+    before `before` (or the newest archived messages at all). The messages are
+    transient Message objects that are not attached to the session.
+    """
+    last_timestamp = sort_key(db, MessageArchive.last_timestamp)
+    query = db.query(MessageArchive.object_key).filter(MessageArchive.conversation_id == conversation_id)
+    if after is not None:
+        chunks = query.filter(
+            keyset_after(db, MessageArchive.last_timestamp, MessageArchive.last_message_id, *after)
+        ).order_by(last_timestamp.asc(), MessageArchive.last_message_id.asc())
+    else:
+        if before is not None:
+            query = query.filter(
+                keyset_before(db, MessageArchive.first_timestamp, MessageArchive.first_message_id, *before)
+            )
+        chunks = query.order_by(last_timestamp.desc(), MessageArchive.last_message_id.desc())
+
+    rows: List[dict] = []
+    for (object_key,) in chunks:
+        chunk = _load_chunk(object_key)
+        if after is not None:
+            rows.extend(row for row in chunk if (row["timestamp"], row["message_id"]) > after)
+        else:
+            rows[:0] = [
+                row for row in chunk if before is None or (row["timestamp"], row["message_id"]) < before
+            ]
+        if len(rows) >= limit:
+            break
+
+    rows = rows[:limit] if after is not None else rows[-limit:]
+    return [Message(**row) for row in rows]
+
+
+def _object_key(conversation_id: str, first_message_id: int, last_message_id: int) -> str:
+    return f"{quote(conversation_id, safe='')}/{first_message_id}-{last_message_id}.jsonl.gz"
+
+
+def archive_conversation(
+    db: Session, store: ArchiveStore, conversation: Conversation, cutoff: datetime, chunk_size: int
+) -> int:
+    """Move the conversation's messages older than `cutoff` into the archive, one committed chunk at a time"""
+    archived = 0
+    while True:
+        query = db.query(*(getattr(Message, field) for field in ARCHIVE_FIELDS)).filter(
+            Message.conversation_id == conversation.conversation_id, Message.timestamp < cutoff
+        )
+        if conversation.last_message_id is not None:
+            query = query.filter(Message.message_id != conversation.last_message_id)
+        rows = query.order_by(Message.timestamp.asc(), Message.message_id.asc()).limit(chunk_size).all()
+        if not rows:
+            return archived
+
+        first, last = rows[0], rows[-1]
+        object_key = _object_key(conversation.conversation_id, first.message_id, last.message_id)
+        # The chunk is durable before the rows go; a crash in between only leaves an unreferenced object
+        store.put(object_key, encode_chunk(rows))
+        db.add(MessageArchive(
+            conversation_id=conversation.conversation_id,
+            object_key=object_key,
+            first_timestamp=first.timestamp,
+            first_message_id=first.message_id,
+            last_timestamp=last.timestamp,
+            last_message_id=last.message_id,
+            message_count=len(rows),
+        ))
+        db.query(Message).filter(Message.message_id.in_([row.message_id for row in rows])).delete(
+            synchronize_session=False
+        )
+        conversation.archived_through_timestamp = last.timestamp
+        conversation.archived_through_message_id = last.message_id
+        db.commit()
+        archived += len(rows)
+        if len(rows) < chunk_size:
+            return archived
+
+
+_PENDING_CHUNK_DELETIONS = "archive_chunk_deletions"
+
+
+def delete_user_archives(db: Session, user_id: int) -> int:
+    """Drop the archived chunks of every conversation the user takes part in, before the user is deleted.
+
+    The manifest rows go with the caller's commit and the chunk objects right after
+    it. Returns the number of chunks dropped.
+    """
+    conversation_ids = select(Conversation.conversation_id).where(
+        or_(Conversation.user_low_id == user_id, Conversation.user_high_id == user_id)
+    )
+    object_keys = [
+        object_key
+        for (object_key,) in db.query(MessageArchive.object_key).filter(
+            MessageArchive.conversation_id.in_(conversation_ids)
+        )
+    ]
+    if object_keys:
+        db.query(MessageArchive).filter(MessageArchive.object_key.in_(object_keys)).delete(
+            synchronize_session=False
+        )
+        db.info.setdefault(_PENDING_CHUNK_DELETIONS, []).extend(object_keys)
+    return len(object_keys)
+
+
+@event.listens_for(Session, "after_commit")
+def _delete_archive_objects(session: Session) -> None:
+    # Only once no manifest row points at them; a failure here only leaves unreferenced objects
+    object_keys = session.info.pop(_PENDING_CHUNK_DELETIONS, None)
+    if not object_keys:
+        return
+    store = get_archive_store()
+    for object_key in object_keys:
+        _chunk_cache.delete(object_key)
+        try:
+            store.delete(object_key)
+        except Exception as e:
+            logger.error(f"Failed to delete archive chunk {object_key}: {str(e)}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_archive_object_deletions(session: Session) -> None:
+    session.info.pop(_PENDING_CHUNK_DELETIONS, None)
+
+
+def archive_messages(
+    db: Session,
+    older_than_days: Optional[int] = None,
+    store: Optional[ArchiveStore] = None,
+    chunk_size: Optional[int] = None,
+) -> Tuple[int, int]:
+    """Archive every conversation's messages older than the cutoff; returns (conversations, messages) archived"""
+    older_than_days = older_than_days if older_than_days is not None else settings.MESSAGE_ARCHIVE_AFTER_DAYS
+    store = store or get_archive_store()
+    chunk_size = chunk_size or settings.MESSAGE_ARCHIVE_CHUNK_SIZE
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+
+    conversation_ids = [
+        conversation_id
+        for (conversation_id,) in db.query(Message.conversation_id)
+        .filter(Message.timestamp < cutoff, Message.conversation_id.isnot(None))
+        .distinct()
+    ]
+    conversations = messages = 0
+    for conversation_id in conversation_ids:
+        conversation = db.query(Conversation).filter(Conversation.conversation_id == conversation_id).first()
+        if not conversation:
+            logger.warning(f"Skipping conversation {conversation_id}: not in the conversations table")
+            continue
+        archived = archive_conversation(db, store, conversation, cutoff, chunk_size)
+        if archived:
+            conversations += 1
+            messages += archived
+    return conversations, messages
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Move old messages into compressed archive chunks")
+    parser.add_argument(
+        "--older-than-days",
+        type=int,
+        default=settings.MESSAGE_ARCHIVE_AFTER_DAYS,
+        help="Archive messages older than this many days",
+    )
+    parser.add_argument("--chunk-size", type=int, default=settings.MESSAGE_ARCHIVE_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        conversations, messages = archive_messages(db, args.older_than_days, chunk_size=args.chunk_size)
+    finally:
+        db.close()
+    logger.info(f"Archived {messages} messages from {conversations} conversations")
+
+
+if __name__ == "__main__":
+    main()
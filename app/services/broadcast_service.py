@@ -0,0 +1,226 @@
+"""
+Admin broadcasts: one message to every user matching a role/status/course/year filter.
+
+Recipients are processed in chunks. Per chunk, the sender's conversations with
+every recipient are resolved or created set-wise, all messages go out in one
+multi-row INSERT ... RETURNING, and one UPDATE moves the conversations'
+last-message pointers and unread counters. The job row records progress after
+every chunk.
+"""
+import logging
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import case, func, insert, or_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import SessionLocal
+from ..models.broadcasts import BroadcastJob
+from ..models.conversations import Conversation
+from ..models.messages import Message
+from ..models.profiles import Profile
+from ..models.users import User
+from .message_service import cache_conversation_id
+from .realtime import hub, message_event
+
+logger = logging.getLogger(__name__)
+
+
+def create_broadcast(db: Session, sender_id: int, content: str, filters: Dict[str, Optional[str]]) -> BroadcastJob:
+    """Record a pending broadcast; run_broadcast delivers it"""
+    job = BroadcastJob(
+        job_id=str(uuid.uuid4()),
+        sender_id=sender_id,
+        content=content,
+        filters={key: value for key, value in filters.items() if value is not None},
+        status="pending",
+        total=0,
+        sent=0,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def resolve_audience(db: Session, sender_id: int, filters: Dict[str, str]) -> List[int]:
+    """Ids of the users matching the broadcast filters, excluding the sender"""
+    query = db.query(User.user_id).filter(User.user_id != sender_id)
+    if filters.get("role"):
+        query = query.filter(User.role == filters["role"])
+    if filters.get("status"):
+        query = query.filter(User.status == filters["status"])
+    if filters.get("course") or filters.get("year_of_study"):
+        query = query.join(Profile, Profile.user_id == User.user_id)
+        if filters.get("course"):
+            query = query.filter(Profile.course == filters["course"])
+        if filters.get("year_of_study"):
+            query = query.filter(Profile.year_of_study == filters["year_of_study"])
+    return [user_id for (user_id,) in query.order_by(User.user_id)]
+
+
+def _pair_filter(sender_id: int, recipient_ids: List[int]):
+    """Conversations between the sender and any of the recipients"""
+    lower = [user_id for user_id in recipient_ids if user_id < sender_id]
+    higher = [user_id for user_id in recipient_ids if user_id > sender_id]
+    return or_(
+        (Conversation.user_high_id == sender_id) & Conversation.user_low_id.in_(lower),
+        (Conversation.user_low_id == sender_id) & Conversation.user_high_id.in_(higher),
+    )
+
+
+def ensure_conversations(db: Session, sender_id: int, recipient_ids: List[int]) -> Dict[int, str]:
+    """Map each recipient to their conversation with the sender, creating missing ones in bulk"""
+    def other(conversation_low: int, conversation_high: int) -> int:
+        return conversation_high if conversation_low == sender_id else conversation_low
+
+    def existing_ids() -> Dict[int, str]:
+        return {
+            other(user_low_id, user_high_id): conversation_id
+            for conversation_id, user_low_id, user_high_id in db.query(
+                Conversation.conversation_id, Conversation.user_low_id, Conversation.user_high_id
+            ).filter(_pair_filter(sender_id, recipient_ids))
+        }
+
+    conversation_ids = existing_ids()
+    missing = [user_id for user_id in recipient_ids if user_id not in conversation_ids]
+    if not missing:
+        return conversation_ids
+
+    # Pairs with only legacy messages keep their conversation id, like get_or_create_conversation
+    other_user = case((Message.sender_id == sender_id, Message.recipient_id), else_=Message.sender_id)
+    latest = (
+        db.query(other_user.label("other_id"), func.max(Message.message_id).label("message_id"))
+        .filter(
+            or_(
+                (Message.sender_id == sender_id) & Message.recipient_id.in_(missing),
+                (Message.recipient_id == sender_id) & Message.sender_id.in_(missing),
+            )
+        )
+        .group_by(other_user)
+        .subquery()
+    )
+    legacy = {
+        other_id: (message_id, conversation_id, timestamp)
+        for other_id, message_id, conversation_id, timestamp in db.query(
+            latest.c.other_id, Message.message_id, Message.conversation_id, Message.timestamp
+        ).join(Message, Message.message_id == latest.c.message_id)
+    }
+
+    rows = []
+    for user_id in missing:
+        user_low_id, user_high_id = sorted((sender_id, user_id))
+        message_id, conversation_id, timestamp = legacy.get(user_id, (None, None, None))
+        rows.append({
+            "conversation_id": conversation_id or str(uuid.uuid4()),
+            "user_low_id": user_low_id,
+            "user_high_id": user_high_id,
+            "last_message_id": message_id,
+            "last_activity": timestamp or datetime.utcnow(),
+            "unread_low": 0,
+            "unread_high": 0,
+        })
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        # A concurrent send may create some of these pairs first; keep whichever row won
+        insert_stmt = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        db.execute(
+            insert_stmt(Conversation.__table__).on_conflict_do_nothing(
+                index_elements=[Conversation.user_low_id, Conversation.user_high_id]
+            ),
+            rows,
+        )
+        return existing_ids()
+
+    db.execute(insert(Conversation.__table__), rows)
+    conversation_ids.update(
+        {other(row["user_low_id"], row["user_high_id"]): row["conversation_id"] for row in rows}
+    )
+    return conversation_ids
+
+
+def send_broadcast_chunk(db: Session, sender_id: int, content: str, recipient_ids: List[int]) -> List[Message]:
+    """Store one message from the sender to each recipient and update their conversations. The caller commits."""
+    conversation_ids = ensure_conversations(db, sender_id, recipient_ids)
+
+    # One multi-row INSERT ... RETURNING for the whole chunk
+    messages = db.scalars(
+        insert(Message).returning(Message),
+        [
+            {
+                "sender_id": sender_id,
+                "recipient_id": recipient_id,
+                "content": content,
+                "conversation_id": conversation_ids[recipient_id],
+                "is_request": False,
+            }
+            for recipient_id in recipient_ids
+        ],
+    ).all()
+
+    newest_message = (
+        db.query(func.max(Message.message_id))
+        .filter(Message.conversation_id == Conversation.conversation_id)
+        .scalar_subquery()
+    )
+    db.query(Conversation).filter(
+        Conversation.conversation_id.in_(list(conversation_ids.values()))
+    ).update(
+        {
+            Conversation.last_message_id: newest_message,
+            Conversation.last_activity: func.now(),
+            # The recipient is whichever participant isn't the sender
+            Conversation.unread_low: Conversation.unread_low
+            + case((Conversation.user_high_id == sender_id, 1), else_=0),
+            Conversation.unread_high: Conversation.unread_high
+            + case((Conversation.user_low_id == sender_id, 1), else_=0),
+        },
+        synchronize_session=False,
+    )
+
+    for recipient_id, conversation_id in conversation_ids.items():
+        cache_conversation_id(sender_id, recipient_id, conversation_id)
+    return messages
+
+
+def run_broadcast(job_id: str, chunk_size: Optional[int] = None) -> None:
+    """Deliver a pending broadcast, committing and recording progress after each chunk"""
+    chunk_size = chunk_size or settings.BROADCAST_CHUNK_SIZE
+    db = SessionLocal()
+    try:
+        job = db.query(BroadcastJob).filter(BroadcastJob.job_id == job_id).first()
+        if not job or job.status != "pending":
+            return
+        recipient_ids = resolve_audience(db, job.sender_id, job.filters or {})
+        job.status = "running"
+        job.total = len(recipient_ids)
+        db.commit()
+
+        for start in range(0, len(recipient_ids), chunk_size):
+            messages = send_broadcast_chunk(
+                db, job.sender_id, job.content, recipient_ids[start:start + chunk_size]
+            )
+            # Build the events before committing expires the returned rows
+            events = [([message.sender_id, message.recipient_id], message_event(message)) for message in messages]
+            job.sent = BroadcastJob.sent + len(messages)
+            db.commit()
+            for user_ids, event in events:
+                hub.publish_threadsafe(user_ids, event)
+
+        job.status = "completed"
+        job.finished_at = func.now()
+        db.commit()
+        logger.info(f"Broadcast {job_id} sent {len(recipient_ids)} messages")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Broadcast {job_id} failed: {str(e)}")
+        db.query(BroadcastJob).filter(BroadcastJob.job_id == job_id).update(
+            {BroadcastJob.status: "failed", BroadcastJob.error: str(e), BroadcastJob.finished_at: func.now()},
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,126 @@
+"""
+Small key/value cache with TTL + LRU eviction and monotonic counters.
+
+CacheBackend is the interface the rest of the app codes against. InProcessCache
+is the default, per-process implementation; a shared backend (e.g. Redis) only
+has to provide the same five methods and can be swapped in with set_cache_backend.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+from ..config import settings
+
+
+class CacheBackend:
+    """Interface for cache backends. Values must be JSON-serializable for shared backends."""
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        """Increment a counter and return its new value. Counters are never evicted."""
+        raise NotImplementedError
+
+    def get_counters(self, keys: Sequence[str]) -> List[int]:
+        """Current values of the given counters, 0 for counters never incremented"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+
+class InProcessCache(CacheBackend):
+    """Thread-safe in-memory cache bounded by entry count, with per-entry expiry."""
+
+    def __init__(self, max_entries: int = 10000, default_ttl: Optional[int] = None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        ttl = ttl if ttl is not None else self.default_ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = self._counters.get(key, 0) + 1
+            self._counters[key] = value
+            return value
+
+    def get_counters(self, keys: Sequence[str]) -> List[int]:
+        with self._lock:
+            return [self._counters.get(key, 0) for key in keys]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+_backend: Optional[CacheBackend] = None
+
+
+def get_cache_backend() -> CacheBackend:
+    """The process-wide cache, an InProcessCache sized from settings unless one was set"""
+    global _backend
+    if _backend is None:
+        _backend = InProcessCache(
+            max_entries=settings.SUGGESTION_CACHE_MAX_ENTRIES,
+            default_ttl=settings.SUGGESTION_CACHE_TTL_SECONDS,
+        )
+    return _backend
+
+
+def set_cache_backend(backend: CacheBackend) -> None:
+    """Replace the process-wide cache, e.g. with a shared backend or a test fake"""
+    global _backend
+    _backend = backend
@@ -0,0 +1,183 @@
+"""
+Personalized feed: recent posts ranked for one viewer.
+
+A new post's audience is every user whose tag profile shares one of its tags
+(user_tags) plus every user who has its author among their stored suggestions.
+fan_out_post runs after the post is created and delivers it:
+  - audiences of up to FEED_FANOUT_MAX_AUDIENCE users get one feed_items row
+    each (fan-out on write);
+  - larger ones (heavy posters, very broad tags) get a single feed_pull_posts
+    row, which feeds pick up when they are read (fan-out on read).
+
+Reading a feed ranks at most FEED_CANDIDATES pushed and FEED_PULL_CANDIDATES
+pulled posts from the last FEED_WINDOW_DAYS, so its cost does not grow with the
+total number of posts. Each candidate scores
+    (tag similarity + FEED_SUGGESTION_BOOST * author's suggestion score) * recency
+where tag similarity is the Jaccard overlap suggestion_service uses between the
+viewer's tag profile and the post's tags, and recency halves every
+FEED_HALF_LIFE_HOURS.
+
+Candidates older than the window are dropped with:
+    python -m app.services.feed_service --prune
+"""
+import argparse
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import exists, insert, or_, select, union
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import SessionLocal
+from ..models.feed import FeedItem, FeedPullPost
+from ..models.posts import Post, PostTag
+from ..models.suggestion import Suggestion
+from ..models.tag_index import UserTag
+from ..models.users import User
+from .post_service import post_columns
+from .suggestion_service import calculate_tag_similarity, get_user_tags
+
+logger = logging.getLogger(__name__)
+
+
+def feed_cutoff() -> datetime:
+    """Creation time of the oldest post still eligible for feeds"""
+    return datetime.utcnow() - timedelta(days=settings.FEED_WINDOW_DAYS)
+
+
+def recency_decay(created_at: datetime) -> float:
+    now = datetime.now(created_at.tzinfo) if created_at.tzinfo else datetime.utcnow()
+    age_hours = max((now - created_at).total_seconds() / 3600, 0.0)
+    return 0.5 ** (age_hours / settings.FEED_HALF_LIFE_HOURS)
+
+
+def resolve_post_audience(db: Session, author_id: int, tags: List[str], limit: int) -> List[int]:
+    """Up to `limit` users a post by the author with these tags is relevant to"""
+    suggested = select(Suggestion.user_id).where(
+        Suggestion.suggested_user_id == author_id, Suggestion.user_id != author_id
+    )
+    audience = suggested
+    if tags:
+        tagged = select(UserTag.user_id).where(UserTag.tag.in_(tags), UserTag.user_id != author_id)
+        audience = union(tagged, suggested)
+    audience = audience.subquery()
+    return list(db.execute(select(audience.c.user_id).limit(limit)).scalars())
+
+
+def fan_out_post(post_id: int) -> None:
+    """Deliver a new post to its audience's feeds; runs as a background task after the post is committed"""
+    db = SessionLocal()
+    try:
+        post = (
+            db.query(Post.post_id, Post.user_id, Post.tags, Post.created_at)
+            .filter(Post.post_id == post_id)
+            .first()
+        )
+        if not post:
+            return
+        # One user past the limit tells whether the audience is too large to fan out
+        audience = resolve_post_audience(
+            db, post.user_id, list(set(post.tags or [])), settings.FEED_FANOUT_MAX_AUDIENCE + 1
+        )
+        if len(audience) > settings.FEED_FANOUT_MAX_AUDIENCE:
+            db.add(FeedPullPost(post_id=post.post_id, user_id=post.user_id, created_at=post.created_at))
+        elif audience:
+            db.execute(
+                insert(FeedItem),
+                [
+                    {"user_id": user_id, "post_id": post.post_id, "created_at": post.created_at}
+                    for user_id in audience
+                ],
+            )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Feed fan-out of post {post_id} failed: {str(e)}")
+    finally:
+        db.close()
+
+
+def remove_post(db: Session, post_id: int) -> None:
+    """Take a post out of every feed, before the post is deleted. The caller commits."""
+    db.query(FeedItem).filter(FeedItem.post_id == post_id).delete(synchronize_session=False)
+    db.query(FeedPullPost).filter(FeedPullPost.post_id == post_id).delete(synchronize_session=False)
+
+
+def get_feed(db: Session, user_id: int, limit: int = 20, offset: int = 0) -> List[dict]:
+    """Recent posts ranked for the user, best first; each row carries its feed score"""
+    cutoff = feed_cutoff()
+    viewer_tags = {tag for tags in get_user_tags(db, user_id).values() for tag in tags}
+    suggested = dict(
+        db.query(Suggestion.suggested_user_id, Suggestion.similarity_score)
+        .filter(Suggestion.user_id == user_id)
+        .order_by(Suggestion.similarity_score.desc())
+        .limit(settings.SUGGESTION_TOP_K)
+        .all()
+    )
+
+    pushed = (
+        db.query(FeedItem.post_id)
+        .filter(FeedItem.user_id == user_id, FeedItem.created_at >= cutoff)
+        .order_by(FeedItem.created_at.desc())
+        .limit(settings.FEED_CANDIDATES)
+    )
+    pulled = (
+        db.query(FeedPullPost.post_id)
+        .filter(
+            FeedPullPost.created_at >= cutoff,
+            FeedPullPost.user_id != user_id,
+            or_(
+                FeedPullPost.user_id.in_(list(suggested)),
+                exists().where(PostTag.post_id == FeedPullPost.post_id, PostTag.tag.in_(viewer_tags)),
+            ),
+        )
+        .order_by(FeedPullPost.created_at.desc())
+        .limit(settings.FEED_PULL_CANDIDATES)
+    )
+    candidate_ids = {post_id for (post_id,) in pushed} | {post_id for (post_id,) in pulled}
+    if not candidate_ids:
+        return []
+
+    rows = (
+        db.query(*post_columns())
+        .join(User, User.user_id == Post.user_id)
+        .filter(Post.post_id.in_(candidate_ids))
+        .all()
+    )
+    viewer_tag_list = list(viewer_tags)
+    scored = []
+    for row in rows:
+        similarity, _ = calculate_tag_similarity(viewer_tag_list, row.tags or [])
+        boost = settings.FEED_SUGGESTION_BOOST * suggested.get(row.user_id, 0.0)
+        scored.append(((similarity + boost) * recency_decay(row.created_at), row))
+    scored.sort(key=lambda item: (-item[0], -item[1].post_id))
+    return [dict(row._asdict(), score=score) for score, row in scored[offset:offset + limit]]
+
+
+def prune_feed(db: Session) -> int:
+    """Delete feed candidates older than the feed window; returns how many rows went"""
+    cutoff = feed_cutoff()
+    removed = db.query(FeedItem).filter(FeedItem.created_at < cutoff).delete(synchronize_session=False)
+    removed += db.query(FeedPullPost).filter(FeedPullPost.created_at < cutoff).delete(synchronize_session=False)
+    db.commit()
+    return removed
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain the feed candidate tables")
+    parser.add_argument("--prune", action="store_true", help="Drop candidates older than FEED_WINDOW_DAYS")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if not args.prune:
+        parser.print_help()
+        return
+    db = SessionLocal()
+    try:
+        removed = prune_feed(db)
+    finally:
+        db.close()
+    logger.info(f"Pruned {removed} feed candidates")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,838 @@
+"""
+Conversation bookkeeping for direct messages.
+
+Every send goes through send_message, which finds (or creates) the conversation
+for the participant pair with one indexed probe, stores the message, and moves
+the conversation's last-message pointer and the recipient's unread counter in
+the same transaction.
+
+A student's first message to an alumnus opens the conversation as a pending
+message request. The alumnus accepts or declines it; InboxCounter keeps each
+user's number of pending requests current on every transition, so reading the
+count never scans conversations or messages.
+
+Clients may tag a send with an idempotency key: a unique (sender_id,
+idempotency_key) index keeps retries from storing duplicates, and a short-lived
+per-process cache answers recent retries without touching the database.
+
+Conversations that predate the conversations table are picked up lazily on the
+next send, or all at once (with the request state of legacy requests) with:
+    python -m app.services.message_service --backfill
+"""
+import argparse
+import logging
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, case, exists, func, literal, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+from ..config import settings
+from ..database import SessionLocal
+from ..models.conversations import Conversation, InboxCounter, RequestStatus
+from ..models.messages import Message
+from ..models.users import User, UserRole, UserStatus
+from . import archive_service
+from .cache import InProcessCache
+from ..utils.pagination import keyset_after, keyset_before, sort_key
+
+logger = logging.getLogger(__name__)
+
+
+# Which roles may message which, checked on every send
+MESSAGE_PERMISSIONS = frozenset({
+    (UserRole.ALUMNI, UserRole.STUDENT),
+    (UserRole.STUDENT, UserRole.ALUMNI),
+    (UserRole.STUDENT, UserRole.MENTOR),
+    (UserRole.MENTOR, UserRole.STUDENT),
+    (UserRole.ALUMNI, UserRole.MENTOR),
+    (UserRole.MENTOR, UserRole.ALUMNI),
+    (UserRole.MENTOR, UserRole.MENTOR),
+    (UserRole.ADMIN, UserRole.STUDENT),
+    (UserRole.ADMIN, UserRole.ALUMNI),
+    (UserRole.ADMIN, UserRole.MENTOR),
+    (UserRole.STUDENT, UserRole.ADMIN),
+    (UserRole.ALUMNI, UserRole.ADMIN),
+    (UserRole.MENTOR, UserRole.ADMIN),
+})
+
+# user_id -> (role, status) of message recipients. Local to the process, so changes
+# made by other workers show up within USER_CACHE_TTL_SECONDS
+_user_access_cache = InProcessCache(
+    max_entries=settings.USER_CACHE_MAX_ENTRIES, default_ttl=settings.USER_CACHE_TTL_SECONDS
+)
+# (user_low_id, user_high_id) -> conversation_id; ids never change once assigned
+_conversation_id_cache = InProcessCache(max_entries=settings.CONVERSATION_CACHE_MAX_ENTRIES)
+# "sender_id:idempotency_key" -> the stored Message, detached from its session
+_idempotency_cache = InProcessCache(
+    max_entries=settings.IDEMPOTENCY_CACHE_MAX_ENTRIES, default_ttl=settings.IDEMPOTENCY_CACHE_TTL_SECONDS
+)
+
+
+def get_user_access(db: Session, user_id: int) -> Optional[Tuple[UserRole, UserStatus]]:
+    """A user's (role, status), from the cache when possible. None if the user doesn't exist."""
+    access = _user_access_cache.get(str(user_id))
+    if access is None:
+        access = db.query(User.role, User.status).filter(User.user_id == user_id).first()
+        if access is None:
+            return None
+        access = (access.role, access.status)
+        _user_access_cache.set(str(user_id), access)
+    return access
+
+
+def invalidate_user_access(user_id: int) -> None:
+    """Forget a user's cached role and status, e.g. after approving or deleting them"""
+    _user_access_cache.delete(str(user_id))
+
+
+def cache_conversation_id(user_a: int, user_b: int, conversation_id: str) -> None:
+    user_low_id, user_high_id = participant_pair(user_a, user_b)
+    _conversation_id_cache.set(f"{user_low_id}:{user_high_id}", conversation_id)
+
+
+def participant_pair(user_a: int, user_b: int) -> Tuple[int, int]:
+    """The (user_low_id, user_high_id) key of a conversation between two users"""
+    return (user_a, user_b) if user_a < user_b else (user_b, user_a)
+
+
+def get_conversation(db: Session, user_a: int, user_b: int, for_update: bool = False) -> Optional[Conversation]:
+    user_low_id, user_high_id = participant_pair(user_a, user_b)
+    query = db.query(Conversation).filter(
+        Conversation.user_low_id == user_low_id, Conversation.user_high_id == user_high_id
+    )
+    if for_update:
+        query = query.with_for_update()
+    return query.first()
+
+
+def get_or_create_conversation(db: Session, user_a: int, user_b: int) -> Conversation:
+    """Return the pair's conversation row, locked for the rest of the transaction, creating it if needed.
+
+    A pair that only has messages from before the conversations table keeps its
+    existing conversation id, with the latest of those messages as its last message.
+    """
+    conversation = get_conversation(db, user_a, user_b, for_update=True)
+    if conversation:
+        return conversation
+
+    user_low_id, user_high_id = participant_pair(user_a, user_b)
+    legacy_message = (
+        db.query(Message)
+        .filter(
+            ((Message.sender_id == user_a) & (Message.recipient_id == user_b))
+            | ((Message.sender_id == user_b) & (Message.recipient_id == user_a))
+        )
+        .order_by(Message.message_id.desc())
+        .first()
+    )
+    conversation = Conversation(
+        conversation_id=(legacy_message and legacy_message.conversation_id) or str(uuid.uuid4()),
+        user_low_id=user_low_id,
+        user_high_id=user_high_id,
+        last_message_id=legacy_message.message_id if legacy_message else None,
+        unread_low=0,
+        unread_high=0,
+    )
+    if legacy_message:
+        conversation.last_activity = legacy_message.timestamp
+
+    # Two first messages between the same pair can race; the unique pair index picks one
+    try:
+        with db.begin_nested():
+            db.add(conversation)
+    except IntegrityError:
+        conversation = get_conversation(db, user_a, user_b, for_update=True)
+    return conversation
+
+
+def find_conversation(db: Session, conversation_id: str) -> Optional[Conversation]:
+    """Look a conversation up by id, adopting it into the conversations table if it only has legacy messages"""
+    conversation = db.query(Conversation).filter(Conversation.conversation_id == conversation_id).first()
+    if conversation:
+        return conversation
+
+    legacy_message = db.query(Message).filter(Message.conversation_id == conversation_id).first()
+    if not legacy_message:
+        return None
+    conversation = get_or_create_conversation(db, legacy_message.sender_id, legacy_message.recipient_id)
+    db.commit()
+    return conversation if conversation.conversation_id == conversation_id else None
+
+
+def adjust_pending_requests(db: Session, user_id: int, delta: int) -> None:
+    """Add `delta` to a user's pending request counter, creating the counter row if needed. The caller commits."""
+    updated = (
+        db.query(InboxCounter)
+        .filter(InboxCounter.user_id == user_id)
+        .update(
+            {InboxCounter.pending_requests: InboxCounter.pending_requests + delta},
+            synchronize_session=False,
+        )
+    )
+    if updated:
+        return
+    try:
+        with db.begin_nested():
+            db.add(InboxCounter(user_id=user_id, pending_requests=max(delta, 0)))
+    except IntegrityError:
+        # Another transaction created the row first
+        adjust_pending_requests(db, user_id, delta)
+
+
+def get_pending_request_count(db: Session, user_id: int) -> int:
+    pending = (
+        db.query(InboxCounter.pending_requests).filter(InboxCounter.user_id == user_id).scalar()
+    )
+    return pending or 0
+
+
+def _open_request(db: Session, conversation: Conversation, sender_id: int, recipient_id: int) -> bool:
+    """Apply a request message to the conversation's request state; returns whether the message is a request.
+
+    Raises PermissionError if the recipient declined the request.
+    """
+    if conversation.request_recipient_id == sender_id:
+        # A reply from the request's recipient; _accept_replied_requests accepts it
+        return False
+    if conversation.request_status == RequestStatus.DECLINED:
+        raise PermissionError("The recipient declined this message request")
+    if conversation.request_status == RequestStatus.PENDING:
+        return True
+    if conversation.request_status is None and conversation.last_message_id is None:
+        # First message of the conversation: it starts out as a request
+        conversation.request_status = RequestStatus.PENDING
+        conversation.request_recipient_id = recipient_id
+        adjust_pending_requests(db, recipient_id, 1)
+        return True
+    # Accepted, or the recipient already wrote first: an ordinary message
+    return False
+
+
+def _reopened_request_status(sender_id: int):
+    """request_status after `sender_id` writes: a request the sender declined is accepted again.
+
+    Set in the conversation UPDATE a send already makes; pending requests are
+    accepted by _accept_replied_requests, which also keeps the counter.
+    """
+    return case(
+        (
+            and_(
+                Conversation.request_recipient_id == sender_id,
+                Conversation.request_status == RequestStatus.DECLINED,
+            ),
+            literal(RequestStatus.ACCEPTED, Conversation.request_status.type),
+        ),
+        else_=Conversation.request_status,
+    )
+
+
+def _accept_replied_requests(db: Session, sender_id: int, conversation_ids) -> None:
+    """Accept the pending requests addressed to the sender in these conversations, since the sender wrote in them. The caller commits."""
+    accepted = (
+        db.query(Conversation)
+        .filter(
+            Conversation.conversation_id.in_(conversation_ids),
+            Conversation.request_status == RequestStatus.PENDING,
+            Conversation.request_recipient_id == sender_id,
+        )
+        .update({Conversation.request_status: RequestStatus.ACCEPTED}, synchronize_session=False)
+    )
+    if accepted:
+        adjust_pending_requests(db, sender_id, -accepted)
+
+
+def send_message(
+    db: Session,
+    sender_id: int,
+    recipient_id: int,
+    content: str,
+    is_request: bool = False,
+    idempotency_key: Optional[str] = None,
+) -> Message:
+    """Store a message and update its conversation in one transaction.
+
+    With the pair's conversation id cached this is one INSERT and two UPDATEs and no
+    reads; the second UPDATE accepts a pending request the sender is replying to, and
+    the first reopens one the sender had declined.
+    Request messages also read the conversation's request state, and raise
+    PermissionError if the recipient declined the request.
+    """
+    pair = participant_pair(sender_id, recipient_id)
+    cache_key = f"{pair[0]}:{pair[1]}"
+    conversation_id = _conversation_id_cache.get(cache_key)
+    if is_request:
+        conversation = get_or_create_conversation(db, sender_id, recipient_id)
+        conversation_id = conversation.conversation_id
+        try:
+            is_request = _open_request(db, conversation, sender_id, recipient_id)
+        except PermissionError:
+            db.rollback()
+            raise
+    elif conversation_id is None:
+        conversation_id = get_or_create_conversation(db, sender_id, recipient_id).conversation_id
+
+    new_message = Message(
+        sender_id=sender_id,
+        recipient_id=recipient_id,
+        content=content,
+        conversation_id=conversation_id,
+        is_request=is_request,
+        idempotency_key=idempotency_key,
+    )
+    db.add(new_message)
+    db.flush()  # eager_defaults: the INSERT returns the id and timestamp
+
+    unread_column = Conversation.unread_low if recipient_id == pair[0] else Conversation.unread_high
+    updated = (
+        db.query(Conversation)
+        .filter(Conversation.conversation_id == conversation_id)
+        .update(
+            {
+                # Concurrent sends can update out of order; keep the pointer on the newest message
+                Conversation.last_message_id: case(
+                    (
+                        or_(
+                            Conversation.last_message_id.is_(None),
+                            Conversation.last_message_id < new_message.message_id,
+                        ),
+                        new_message.message_id,
+                    ),
+                    else_=Conversation.last_message_id,
+                ),
+                Conversation.last_activity: func.now(),
+                Conversation.request_status: _reopened_request_status(sender_id),
+                unread_column: unread_column + 1,
+            },
+            synchronize_session=False,
+        )
+    )
+    if not updated:
+        # The cached conversation is gone (a participant was deleted); start over uncached
+        db.rollback()
+        _conversation_id_cache.delete(cache_key)
+        return send_message(db, sender_id, recipient_id, content, is_request, idempotency_key)
+    _accept_replied_requests(db, sender_id, [conversation_id])
+
+    # Detach before committing so the loaded attributes aren't expired and re-read
+    db.expunge(new_message)
+    db.commit()
+    cache_conversation_id(sender_id, recipient_id, conversation_id)
+    return new_message
+
+
+def _idempotency_cache_key(sender_id: int, idempotency_key: str) -> str:
+    return f"{sender_id}:{idempotency_key}"
+
+
+def _check_replay(stored: Tuple[int, str], recipient_id: int, content: str) -> None:
+    """Reject reusing an idempotency key for a message with another (recipient_id, content)"""
+    if stored != (recipient_id, content):
+        raise ValueError("Idempotency key was already used for a different message")
+
+
+def _stored_messages(db: Session, sender_id: int, idempotency_keys) -> Dict[str, Message]:
+    """The sender's messages already stored under any of the keys, from the dedupe cache or one query"""
+    stored = {}
+    missing = []
+    for idempotency_key in idempotency_keys:
+        message = _idempotency_cache.get(_idempotency_cache_key(sender_id, idempotency_key))
+        if message is None:
+            missing.append(idempotency_key)
+        else:
+            stored[idempotency_key] = message
+    if missing:
+        for message in db.query(Message).filter(
+            Message.sender_id == sender_id, Message.idempotency_key.in_(missing)
+        ):
+            db.expunge(message)
+            stored[message.idempotency_key] = message
+            _idempotency_cache.set(_idempotency_cache_key(sender_id, message.idempotency_key), message)
+    return stored
+
+
+def send_message_once(
+    db: Session, sender_id: int, recipient_id: int, content: str, is_request: bool, idempotency_key: str
+) -> Tuple[Message, bool]:
+    """send_message that stores at most one message per sender and idempotency key.
+
+    Returns (message, created). A retry seen recently by this worker is answered from
+    the dedupe cache without touching the database; any other retry hits the unique
+    index on insert and returns the stored message. Raises ValueError if the key was
+    used for a different message.
+    """
+    cache_key = _idempotency_cache_key(sender_id, idempotency_key)
+    message = _idempotency_cache.get(cache_key)
+    if message is None:
+        try:
+            message = send_message(db, sender_id, recipient_id, content, is_request, idempotency_key)
+            _idempotency_cache.set(cache_key, message)
+            return message, True
+        except IntegrityError:
+            db.rollback()
+            message = _stored_messages(db, sender_id, [idempotency_key]).get(idempotency_key)
+            if message is None:
+                raise
+    _check_replay((message.recipient_id, message.content), recipient_id, content)
+    return message, False
+
+
+def _unread_increments(counts: Dict[str, int]):
+    return case(counts, value=Conversation.conversation_id, else_=0) if counts else 0
+
+
+def _send_batch(db: Session, sender_id: int, items: List[Tuple[int, str, bool, Optional[str]]]):
+    """Stage a batch for send_messages; returns (results, conversation_ids), or None if a cached conversation is gone"""
+    stored = _stored_messages(db, sender_id, {key for *_, key in items if key})
+    results: List[Optional[Tuple[Message, bool]]] = [None] * len(items)
+    first_with_key: Dict[str, int] = {}
+    new_messages: List[Tuple[int, Message]] = []
+    conversations: Dict[int, Conversation] = {}
+    conversation_ids: Dict[int, str] = {}
+
+    for index, (recipient_id, content, is_request, idempotency_key) in enumerate(items):
+        if idempotency_key in stored:
+            message = stored[idempotency_key]
+            _check_replay((message.recipient_id, message.content), recipient_id, content)
+            results[index] = (message, False)
+            continue
+        if idempotency_key in first_with_key:
+            # Repeated within the batch: answered with the first item's message below
+            _check_replay(tuple(items[first_with_key[idempotency_key]][:2]), recipient_id, content)
+            continue
+        if idempotency_key:
+            first_with_key[idempotency_key] = index
+
+        if is_request:
+            if recipient_id not in conversations:
+                conversations[recipient_id] = get_or_create_conversation(db, sender_id, recipient_id)
+            conversation_ids[recipient_id] = conversations[recipient_id].conversation_id
+            is_request = _open_request(db, conversations[recipient_id], sender_id, recipient_id)
+        elif recipient_id not in conversation_ids:
+            pair = participant_pair(sender_id, recipient_id)
+            conversation_id = _conversation_id_cache.get(f"{pair[0]}:{pair[1]}")
+            if conversation_id is None:
+                conversation_id = get_or_create_conversation(db, sender_id, recipient_id).conversation_id
+            conversation_ids[recipient_id] = conversation_id
+
+        new_messages.append((index, Message(
+            sender_id=sender_id,
+            recipient_id=recipient_id,
+            content=content,
+            conversation_id=conversation_ids[recipient_id],
+            is_request=is_request,
+            idempotency_key=idempotency_key,
+        )))
+
+    if new_messages:
+        db.add_all(message for _, message in new_messages)
+        db.flush()  # One multi-row INSERT returning the ids and timestamps
+
+        unread_low: Dict[str, int] = {}
+        unread_high: Dict[str, int] = {}
+        for _, message in new_messages:
+            unread = unread_low if message.recipient_id < sender_id else unread_high
+            unread[message.conversation_id] = unread.get(message.conversation_id, 0) + 1
+
+        newest_message = (
+            db.query(func.max(Message.message_id))
+            .filter(Message.conversation_id == Conversation.conversation_id)
+            .scalar_subquery()
+        )
+        batch_conversation_ids = set(conversation_ids.values())
+        updated = db.query(Conversation).filter(
+            Conversation.conversation_id.in_(batch_conversation_ids)
+        ).update(
+            {
+                Conversation.last_message_id: newest_message,
+                Conversation.last_activity: func.now(),
+                Conversation.request_status: _reopened_request_status(sender_id),
+                Conversation.unread_low: Conversation.unread_low + _unread_increments(unread_low),
+                Conversation.unread_high: Conversation.unread_high + _unread_increments(unread_high),
+            },
+            synchronize_session=False,
+        )
+        if updated < len(batch_conversation_ids):
+            return None
+        _accept_replied_requests(db, sender_id, batch_conversation_ids)
+
+    for index, message in new_messages:
+        db.expunge(message)
+        results[index] = (message, True)
+    for index, (_, _, _, idempotency_key) in enumerate(items):
+        if results[index] is None:
+            results[index] = (results[first_with_key[idempotency_key]][0], False)
+    return results, conversation_ids
+
+
+def send_messages(
+    db: Session, sender_id: int, items: List[Tuple[int, str, bool, Optional[str]]]
+) -> List[Tuple[Message, bool]]:
+    """Store several messages from one sender in one transaction; returns (message, created) per item, in order.
+
+    Items are (recipient_id, content, is_request, idempotency_key). An item whose key
+    was already used returns the stored message instead of a new one. Either every
+    new message is committed or none is. Raises PermissionError like send_message and
+    ValueError if a key was used for a different message.
+    """
+    # A second attempt covers a cached conversation that is gone (a participant was
+    # deleted) and a concurrent send that stored one of the keys first; it resolves
+    # every conversation uncached and replays the keys that now exist
+    for attempt in range(2):
+        try:
+            outcome = _send_batch(db, sender_id, items)
+        except IntegrityError:
+            db.rollback()
+            if attempt:
+                raise
+            continue
+        except (PermissionError, ValueError):
+            db.rollback()
+            raise
+        if outcome is None:
+            db.rollback()
+            for recipient_id, _, _, _ in items:
+                pair = participant_pair(sender_id, recipient_id)
+                _conversation_id_cache.delete(f"{pair[0]}:{pair[1]}")
+            continue
+
+        results, conversation_ids = outcome
+        db.commit()
+        for recipient_id, conversation_id in conversation_ids.items():
+            cache_conversation_id(sender_id, recipient_id, conversation_id)
+        for message, created in results:
+            if created and message.idempotency_key:
+                _idempotency_cache.set(_idempotency_cache_key(sender_id, message.idempotency_key), message)
+        return results
+    raise RuntimeError("Conversations changed while sending the batch")
+
+
+def respond_to_request(db: Session, conversation: Conversation, user_id: int, accept: bool) -> bool:
+    """Accept or decline a message request addressed to the user; returns False if there is none to answer.
+
+    Pending requests can be accepted or declined, and a declined request can still be accepted later.
+    """
+    conversation = (
+        db.query(Conversation)
+        .filter(Conversation.conversation_id == conversation.conversation_id)
+        .with_for_update()
+        .first()
+    )
+    allowed = (RequestStatus.PENDING, RequestStatus.DECLINED) if accept else (RequestStatus.PENDING,)
+    if not conversation or conversation.request_recipient_id != user_id or conversation.request_status not in allowed:
+        db.rollback()
+        return False
+
+    if conversation.request_status == RequestStatus.PENDING:
+        adjust_pending_requests(db, user_id, -1)
+    conversation.request_status = RequestStatus.ACCEPTED if accept else RequestStatus.DECLINED
+    db.commit()
+    return True
+
+
+def release_pending_requests(db: Session, user_id: int) -> None:
+    """Take the pending requests a user sent off their recipients' counters, before the user is deleted. The caller commits."""
+    pending = (
+        db.query(Conversation.request_recipient_id, func.count())
+        .filter(
+            or_(Conversation.user_low_id == user_id, Conversation.user_high_id == user_id),
+            Conversation.request_status == RequestStatus.PENDING,
+            Conversation.request_recipient_id != user_id,
+        )
+        .group_by(Conversation.request_recipient_id)
+        .all()
+    )
+    for recipient_id, count in pending:
+        adjust_pending_requests(db, recipient_id, -count)
+
+
+def mark_conversation_read(db: Session, conversation: Conversation, user_id: int) -> None:
+    """Reset the user's unread counter for a conversation they take part in"""
+    if user_id == conversation.user_low_id:
+        conversation.unread_low = 0
+    else:
+        conversation.unread_high = 0
+    db.commit()
+
+
+def get_history(
+    db: Session,
+    conversation: Conversation,
+    limit: int = 50,
+    before: Optional[Tuple[datetime, int]] = None,
+    after: Optional[Tuple[datetime, int]] = None,
+) -> Tuple[List[Message], bool]:
+    """One page of a conversation in chronological order, and whether more messages lie in the paging direction.
+
+    `before`/`after` are the (timestamp, message_id) of a message to page away from;
+    with neither, the page is the latest `limit` messages. Pages that reach past the
+    oldest message still in the messages table continue into the archive.
+    """
+    conversation_id = conversation.conversation_id
+    archived_through = None
+    if conversation.archived_through_message_id is not None:
+        archived_through = (conversation.archived_through_timestamp, conversation.archived_through_message_id)
+
+    timestamp = sort_key(db, Message.timestamp)
+    query = db.query(Message).filter(Message.conversation_id == conversation_id)
+    # One extra row tells whether another page follows
+    if after is not None:
+        messages = []
+        if archived_through is not None and after < archived_through:
+            messages = archive_service.read_archived_messages(db, conversation_id, limit + 1, after=after)
+        if len(messages) <= limit:
+            messages += (
+                query.filter(keyset_after(db, Message.timestamp, Message.message_id, *after))
+                .order_by(timestamp.asc(), Message.message_id.asc())
+                .limit(limit + 1 - len(messages))
+                .all()
+            )
+    else:
+        if before is not None:
+            query = query.filter(keyset_before(db, Message.timestamp, Message.message_id, *before))
+        messages = query.order_by(timestamp.desc(), Message.message_id.desc()).limit(limit + 1).all()
+        if len(messages) <= limit and archived_through is not None:
+            # Walked past the hot window; everything archived is older than it
+            archived = archive_service.read_archived_messages(
+                db, conversation_id, limit + 1 - len(messages), before=before
+            )
+            messages += reversed(archived)
+
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if after is None:
+        messages.reverse()
+    return messages, has_more
+
+
+# Column order of the rows returned by get_user_messages
+USER_MESSAGE_FIELDS = (
+    "message_id",
+    "sender_id",
+    "recipient_id",
+    "content",
+    "conversation_id",
+    "is_request",
+    "timestamp",
+    "sender_name",
+    "recipient_name",
+)
+
+
+def get_user_messages(db: Session, user_id: int, last_n: Optional[int] = None, batch_size: int = 1000):
+    """Every message a user sent or received (or the last `last_n` of each conversation), oldest first.
+
+    Rows are plain column tuples in USER_MESSAGE_FIELDS order, fetched in batches of
+    `batch_size` rather than as ORM entities.
+    """
+    participant = or_(Message.sender_id == user_id, Message.recipient_id == user_id)
+    sender = aliased(User)
+    recipient = aliased(User)
+    query = (
+        db.query(
+            Message.message_id,
+            Message.sender_id,
+            Message.recipient_id,
+            Message.content,
+            Message.conversation_id,
+            Message.is_request,
+            Message.timestamp,
+            sender.name.label("sender_name"),
+            recipient.name.label("recipient_name"),
+        )
+        .join(sender, sender.user_id == Message.sender_id)
+        .join(recipient, recipient.user_id == Message.recipient_id)
+    )
+    if last_n is None:
+        query = query.filter(participant)
+    else:
+        ranked = (
+            db.query(
+                Message.message_id,
+                func.row_number()
+                .over(
+                    partition_by=Message.conversation_id,
+                    order_by=(Message.timestamp.desc(), Message.message_id.desc()),
+                )
+                .label("position"),
+            )
+            .filter(participant)
+            .subquery()
+        )
+        query = query.join(ranked, ranked.c.message_id == Message.message_id).filter(
+            ranked.c.position <= last_n
+        )
+    return query.order_by(Message.timestamp.asc(), Message.message_id.asc()).yield_per(batch_size)
+
+
+def _conversation_summary(
+    conversation: Conversation, user_id: int, other_user_id: int, other_user_name: str
+) -> dict:
+    return {
+        "conversation_id": conversation.conversation_id,
+        "other_user_id": other_user_id,
+        "other_user_name": other_user_name,
+        "last_message_id": conversation.last_message_id,
+        "last_activity": conversation.last_activity,
+        "unread_count": (
+            conversation.unread_low if user_id == conversation.user_low_id else conversation.unread_high
+        ),
+        "request_status": conversation.request_status,
+    }
+
+
+def get_inbox(db: Session, user_id: int, limit: int = 50, offset: int = 0) -> List[dict]:
+    """Conversation summaries for a user, most recently active first, without loading any message bodies"""
+    other_user = aliased(User)
+    rows = (
+        db.query(Conversation, other_user.user_id, other_user.name)
+        .join(
+            other_user,
+            other_user.user_id
+            == case(
+                (Conversation.user_low_id == user_id, Conversation.user_high_id),
+                else_=Conversation.user_low_id,
+            ),
+        )
+        .filter(or_(Conversation.user_low_id == user_id, Conversation.user_high_id == user_id))
+        .order_by(Conversation.last_activity.desc(), Conversation.conversation_id)
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
+    return [
+        _conversation_summary(conversation, user_id, other_user_id, other_user_name)
+        for conversation, other_user_id, other_user_name in rows
+    ]
+
+
+def get_message_requests(db: Session, user_id: int, limit: int = 50, offset: int = 0) -> List[dict]:
+    """Pending message requests addressed to a user, most recent first, read through idx_conversation_request_inbox"""
+    requester = aliased(User)
+    rows = (
+        db.query(Conversation, requester.user_id, requester.name)
+        .join(
+            requester,
+            requester.user_id
+            == case(
+                (Conversation.user_low_id == user_id, Conversation.user_high_id),
+                else_=Conversation.user_low_id,
+            ),
+        )
+        .filter(
+            Conversation.request_recipient_id == user_id,
+            Conversation.request_status == RequestStatus.PENDING,
+        )
+        .order_by(Conversation.last_activity.desc(), Conversation.conversation_id)
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
+    return [
+        _conversation_summary(conversation, user_id, requester_id, requester_name)
+        for conversation, requester_id, requester_name in rows
+    ]
+
+
+def backfill_conversations(db: Session, batch_size: int = 1000) -> int:
+    """Create conversation rows for every pair that has messages but no conversation yet"""
+    existing = {
+        (user_low_id, user_high_id)
+        for user_low_id, user_high_id in db.query(Conversation.user_low_id, Conversation.user_high_id)
+    }
+
+    # Oldest message first: the first conversation id seen for a pair is the one
+    # every later legacy send reused, and the last message seen is the latest
+    pairs = {}
+    messages = (
+        db.query(Message.message_id, Message.sender_id, Message.recipient_id, Message.conversation_id, Message.timestamp)
+        .order_by(Message.message_id)
+        .yield_per(batch_size)
+    )
+    for message_id, sender_id, recipient_id, conversation_id, timestamp in messages:
+        pair = participant_pair(sender_id, recipient_id)
+        if pair in existing:
+            continue
+        if pair not in pairs:
+            pairs[pair] = Conversation(
+                conversation_id=conversation_id or str(uuid.uuid4()),
+                user_low_id=pair[0],
+                user_high_id=pair[1],
+                unread_low=0,
+                unread_high=0,
+            )
+        pairs[pair].last_message_id = message_id
+        pairs[pair].last_activity = timestamp
+
+    db.add_all(pairs.values())
+    db.commit()
+    return len(pairs)
+
+
+def backfill_message_requests(db: Session) -> int:
+    """Give request state to conversations holding request messages from before request tracking, then recount counters.
+
+    A request counts as accepted if its recipient has written in the conversation, pending otherwise.
+    """
+    request_message = select(Message.recipient_id).where(
+        Message.conversation_id == Conversation.conversation_id, Message.is_request.is_(True)
+    )
+    updated = (
+        db.query(Conversation)
+        .filter(Conversation.request_status.is_(None), exists(request_message))
+        .update(
+            {
+                Conversation.request_status: RequestStatus.PENDING,
+                Conversation.request_recipient_id: request_message.limit(1).scalar_subquery(),
+            },
+            synchronize_session=False,
+        )
+    )
+    recipient_replied = exists().where(
+        Message.conversation_id == Conversation.conversation_id,
+        Message.sender_id == Conversation.request_recipient_id,
+    )
+    db.query(Conversation).filter(
+        Conversation.request_status == RequestStatus.PENDING, recipient_replied
+    ).update({Conversation.request_status: RequestStatus.ACCEPTED}, synchronize_session=False)
+
+    recount_pending_requests(db)
+    db.commit()
+    return updated
+
+
+def recount_pending_requests(db: Session) -> None:
+    """Rebuild every pending request counter from the conversations table. The caller commits."""
+    counts = (
+        db.query(Conversation.request_recipient_id, func.count())
+        .filter(Conversation.request_status == RequestStatus.PENDING)
+        .group_by(Conversation.request_recipient_id)
+        .all()
+    )
+    db.query(InboxCounter).update({InboxCounter.pending_requests: 0}, synchronize_session=False)
+    for user_id, count in counts:
+        adjust_pending_requests(db, user_id, count)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain the conversations table")
+    parser.add_argument(
+        "--backfill", action="store_true", help="Create conversations for pairs with only legacy messages"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if not args.backfill:
+        parser.print_help()
+        return
+    db = SessionLocal()
+    try:
+        created = backfill_conversations(db)
+        requests = backfill_message_requests(db)
+    finally:
+        db.close()
+    logger.info(f"Created {created} conversations, found {requests} message requests")
+
+
+if __name__ == "__main__":
+    main()
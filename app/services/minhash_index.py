@@ -0,0 +1,224 @@
+"""
+Approximate candidate search over per-user tag sets with MinHash + LSH.
+
+Each user's tag set is reduced to a MinHash signature, cut into bands, and
+users whose signatures agree on a whole band become candidates. The base
+index is built offline, saved as .npy arrays and memory-mapped by workers;
+tag changes after the build go into a small in-memory overlay.
+
+Build it with:
+    python -m app.services.minhash_index --output /var/lib/connect/minhash
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+import numpy as np
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import SessionLocal
+from ..models.tag_index import UserTagProfile
+
+logger = logging.getLogger(__name__)
+
+_PRIME = (1 << 31) - 1  # Keeps a * x + b inside 64 bits for the universal hashes
+_EMPTY = np.iinfo(np.uint32).max
+
+
+def _tag_hash(tag: str) -> int:
+    return int.from_bytes(hashlib.blake2b(tag.encode("utf-8"), digest_size=8).digest(), "little") % _PRIME
+
+
+class MinHashLSH:
+    """
+    MinHash signatures with banded locality-sensitive hashing.
+
+    `num_perm` and `bands` are the recall/latency knobs: more bands of fewer rows
+    each raise recall (and candidate counts) for a given similarity, while
+    `max_candidates` at query time caps the exact rescoring work.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 64, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.seed = seed
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _PRIME, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, _PRIME, size=num_perm).astype(np.uint64)
+        self._band_coeffs = (rng.randint(1, 1 << 62, size=self.rows_per_band, dtype=np.int64) | 1).astype(np.uint64)
+
+        # Base index (built offline, possibly memory-mapped)
+        self.user_ids = np.empty(0, dtype=np.int64)
+        self.signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self._band_sorted = np.empty((bands, 0), dtype=np.uint64)
+        self._band_order = np.empty((bands, 0), dtype=np.int64)
+
+        # Incremental overlay: user_id -> signature (None once the user has no tags)
+        self._delta: Dict[int, Optional[np.ndarray]] = {}
+        self._delta_buckets: List[Dict[int, Set[int]]] = [{} for _ in range(bands)]
+
+    def signature(self, tags: Iterable[str]) -> np.ndarray:
+        hashes = np.array([_tag_hash(tag) for tag in set(tags)], dtype=np.uint64)
+        if not len(hashes):
+            return np.full(self.num_perm, _EMPTY, dtype=np.uint32)
+        values = (np.outer(hashes, self._a) + self._b) % np.uint64(_PRIME)
+        return values.min(axis=0).astype(np.uint32)
+
+    def _band_hashes(self, signatures: np.ndarray) -> np.ndarray:
+        bands = signatures.reshape(len(signatures), self.bands, self.rows_per_band).astype(np.uint64)
+        return (bands * self._band_coeffs).sum(axis=2, dtype=np.uint64)  # Wraps mod 2**64
+
+    def build(self, user_ids: Sequence[int], tag_sets: Sequence[Iterable[str]]) -> "MinHashLSH":
+        """Build the base index from scratch, discarding any overlay"""
+        signatures = np.vstack([self.signature(tags) for tags in tag_sets]) if len(user_ids) else self.signatures[:0]
+        self._set_base(np.asarray(user_ids, dtype=np.int64), signatures)
+        return self
+
+    def _set_base(self, user_ids: np.ndarray, signatures: np.ndarray) -> None:
+        band_hashes = self._band_hashes(signatures)
+        order = np.argsort(band_hashes, axis=0, kind="stable")
+        self.user_ids = user_ids
+        self.signatures = signatures
+        self._band_order = np.ascontiguousarray(order.T)
+        self._band_sorted = np.ascontiguousarray(np.take_along_axis(band_hashes, order, axis=0).T)
+        self._delta = {}
+        self._delta_buckets = [{} for _ in range(self.bands)]
+
+    def insert(self, user_id: int, tags: Iterable[str]) -> None:
+        """Add or replace one user's tag set in the in-memory overlay"""
+        previous = self._delta.get(user_id)
+        if previous is not None:
+            for band, key in enumerate(self._band_hashes(previous[None])[0]):
+                self._delta_buckets[band].get(int(key), set()).discard(user_id)
+
+        tags = list(tags)
+        if not tags:
+            self._delta[user_id] = None
+            return
+        signature = self.signature(tags)
+        self._delta[user_id] = signature
+        for band, key in enumerate(self._band_hashes(signature[None])[0]):
+            self._delta_buckets[band].setdefault(int(key), set()).add(user_id)
+
+    def query(self, tags: Iterable[str], max_candidates: Optional[int] = None) -> np.ndarray:
+        """User ids sharing at least one band with the tag set, most colliding bands first"""
+        band_hashes = self._band_hashes(self.signature(tags)[None])[0]
+        base_hits = []
+        overlay_hits = []
+        for band, key in enumerate(band_hashes):
+            sorted_hashes = self._band_sorted[band]
+            lo = np.searchsorted(sorted_hashes, key, side="left")
+            hi = np.searchsorted(sorted_hashes, key, side="right")
+            if hi > lo:
+                base_hits.append(self.user_ids[self._band_order[band, lo:hi]])
+            overlay_hits.extend(self._delta_buckets[band].get(int(key), ()))
+
+        hits = np.concatenate(base_hits) if base_hits else np.empty(0, dtype=np.int64)
+        if self._delta:
+            # Base entries of users in the overlay are stale; only their overlay entries count
+            hits = hits[~np.isin(hits, np.fromiter(self._delta.keys(), dtype=np.int64))]
+        if overlay_hits:
+            hits = np.concatenate([hits, np.array(overlay_hits, dtype=np.int64)])
+        if not len(hits):
+            return hits
+
+        candidates, collisions = np.unique(hits, return_counts=True)
+        order = np.argsort(-collisions, kind="stable")
+        if max_candidates:
+            order = order[:max_candidates]
+        return candidates[order]
+
+    def compact(self) -> None:
+        """Fold the overlay into the base arrays"""
+        if not self._delta:
+            return
+        keep = ~np.isin(self.user_ids, np.fromiter(self._delta.keys(), dtype=np.int64))
+        added = [(user_id, sig) for user_id, sig in self._delta.items() if sig is not None]
+        user_ids = np.concatenate([self.user_ids[keep], np.array([u for u, _ in added], dtype=np.int64)])
+        signatures = np.vstack([np.asarray(self.signatures[keep])] + [sig[None] for _, sig in added])
+        order = np.argsort(user_ids, kind="stable")
+        self._set_base(user_ids[order], signatures[order])
+
+    def save(self, path: str) -> None:
+        """Write the index (overlay included) as .npy arrays under `path`"""
+        self.compact()
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "user_ids.npy"), self.user_ids)
+        np.save(os.path.join(path, "signatures.npy"), self.signatures)
+        np.save(os.path.join(path, "band_sorted.npy"), self._band_sorted)
+        np.save(os.path.join(path, "band_order.npy"), self._band_order)
+        with open(os.path.join(path, "meta.json"), "w") as meta_file:
+            json.dump({"num_perm": self.num_perm, "bands": self.bands, "seed": self.seed}, meta_file)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "MinHashLSH":
+        """Load a saved index, memory-mapping the arrays so workers share the pages"""
+        with open(os.path.join(path, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+        index = cls(meta["num_perm"], meta["bands"], meta["seed"])
+        mmap_mode = "r" if mmap else None
+        index.user_ids = np.load(os.path.join(path, "user_ids.npy"), mmap_mode=mmap_mode)
+        index.signatures = np.load(os.path.join(path, "signatures.npy"), mmap_mode=mmap_mode)
+        index._band_sorted = np.load(os.path.join(path, "band_sorted.npy"), mmap_mode=mmap_mode)
+        index._band_order = np.load(os.path.join(path, "band_order.npy"), mmap_mode=mmap_mode)
+        return index
+
+
+_index: Optional[MinHashLSH] = None
+_index_loaded = False
+
+
+def get_minhash_index() -> Optional[MinHashLSH]:
+    """The process-wide index when SUGGESTION_ENGINE is "minhash", loaded on first use"""
+    global _index, _index_loaded
+    if settings.SUGGESTION_ENGINE != "minhash":
+        return None
+    if not _index_loaded:
+        _index_loaded = True
+        path = settings.MINHASH_INDEX_PATH
+        if path and os.path.exists(os.path.join(path, "meta.json")):
+            _index = MinHashLSH.load(path)
+            logger.info(f"Loaded MinHash index for {len(_index.user_ids)} users from {path}")
+        else:
+            logger.error(f"MinHash index not found at {path}; falling back to exact suggestions")
+    return _index
+
+
+def build_minhash_index(db: Session, num_perm: int, bands: int) -> MinHashLSH:
+    """Build an index over every user's materialized tag profile"""
+    rows = (
+        db.query(UserTagProfile.user_id, UserTagProfile.tag_counts)
+        .filter(UserTagProfile.tag_count > 0)
+        .order_by(UserTagProfile.user_id)
+        .all()
+    )
+    return MinHashLSH(num_perm, bands).build(
+        [user_id for user_id, _ in rows], [list(tag_counts) for _, tag_counts in rows]
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build the MinHash LSH suggestion index")
+    parser.add_argument("--output", default=settings.MINHASH_INDEX_PATH, required=not settings.MINHASH_INDEX_PATH)
+    parser.add_argument("--num-perm", type=int, default=settings.MINHASH_NUM_PERM)
+    parser.add_argument("--bands", type=int, default=settings.MINHASH_BANDS)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        index = build_minhash_index(db, args.num_perm, args.bands)
+    finally:
+        db.close()
+    index.save(args.output)
+    logger.info(f"Saved MinHash index for {len(index.user_ids)} users to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
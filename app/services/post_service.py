@@ -0,0 +1,310 @@
+"""
+Reading posts for the feed, and the post_tags index behind tag filters.
+
+The feed is paged by keyset on (created_at, post_id), newest first, using
+idx_post_created, so each page costs the same however many posts exist. Rows are
+fetched as plain column tuples in POST_FIELDS order instead of ORM entities.
+
+Keyword filters and search use the posts' full-text index on PostgreSQL (see
+search_service) and fall back to ILIKE / a per-process InvertedIndex elsewhere.
+Serialized feed pages are cached by filter parameters (see page_cache_key);
+creating or deleting a post invalidates them once it commits.
+
+Tag filters and tag counts read post_tags, kept in step with posts by
+add_post_tags / delete_post_tags. Posts from before post_tags are indexed with:
+    python -m app.services.post_service --backfill-tags
+"""
+import argparse
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import and_, event, exists, func, literal_column
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import SessionLocal
+from ..models.posts import Post, PostTag
+from ..models.users import User
+from .cache import get_cache_backend
+from .search_service import HEADLINE_OPTIONS, SEARCH_CONFIG, InvertedIndex, highlight, match_search_vector
+from ..utils.pagination import keyset_before, sort_key
+
+logger = logging.getLogger(__name__)
+
+# Column order of the rows returned by get_posts_page
+POST_FIELDS = (
+    "post_id",
+    "user_id",
+    "content",
+    "tags",
+    "created_at",
+    "user_name",
+    "user_role",
+)
+
+
+def post_columns():
+    return (
+        Post.post_id,
+        Post.user_id,
+        Post.content,
+        Post.tags,
+        Post.created_at,
+        User.name.label("user_name"),
+        User.role.label("user_role"),
+    )
+
+
+def add_post_tags(db: Session, post: Post) -> None:
+    """Index a new post's tags in post_tags. The caller commits."""
+    db.flush()  # eager_defaults: the INSERT returns post_id and created_at
+    db.add_all(
+        PostTag(post_id=post.post_id, tag=tag, created_at=post.created_at)
+        for tag in set(post.tags or [])
+    )
+
+
+def delete_post_tags(db: Session, post_id: int) -> None:
+    """Drop a post's rows from post_tags, before the post is deleted. The caller commits."""
+    db.query(PostTag).filter(PostTag.post_id == post_id).delete(synchronize_session=False)
+
+
+def tag_filter(tags: List[str], match: str = "all"):
+    """Condition on Post: carries every tag (match="all") or any of them (match="any")"""
+    if match == "any":
+        return exists().where(PostTag.post_id == Post.post_id, PostTag.tag.in_(tags))
+    return and_(*(exists().where(PostTag.post_id == Post.post_id, PostTag.tag == tag) for tag in tags))
+
+
+def get_tag_counts(
+    db: Session,
+    tags: Optional[List[str]] = None,
+    match: str = "all",
+    prefix: Optional[str] = None,
+    limit: int = 50,
+) -> List[dict]:
+    """Number of posts per tag, most used first.
+
+    With `tags`, counts only posts matching that filter (facets for the current
+    selection); without, the counts come from idx_post_tag_created alone.
+    """
+    query = db.query(PostTag.tag, func.count().label("count"))
+    if tags:
+        query = query.filter(
+            PostTag.post_id.in_(db.query(Post.post_id).filter(tag_filter(tags, match)))
+        )
+    if prefix:
+        query = query.filter(PostTag.tag.startswith(prefix, autoescape=True))
+    rows = query.group_by(PostTag.tag).order_by(func.count().desc(), PostTag.tag).limit(limit).all()
+    return [row._asdict() for row in rows]
+
+
+def get_posts_page(
+    db: Session,
+    limit: int = 20,
+    before: Optional[Tuple[datetime, int]] = None,
+    keyword: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+    match: str = "all",
+) -> Tuple[list, bool]:
+    """One page of posts, newest first, and whether older posts follow.
+
+    `before` is the (created_at, post_id) of the last post of the previous page.
+    `tags` keeps posts carrying all of the tags, or any of them with match="any".
+    """
+    query = db.query(*post_columns()).join(User, User.user_id == Post.user_id)
+
+    # Apply filters
+    if keyword:
+        if db.get_bind().dialect.name == "postgresql":
+            query = query.filter(match_search_vector("posts", keyword)[0])
+        else:
+            query = query.filter(Post.content.ilike(f"%{keyword}%"))
+
+    if tags:
+        query = query.filter(tag_filter(tags, match))
+
+    if before is not None:
+        query = query.filter(keyset_before(db, Post.created_at, Post.post_id, *before))
+
+    # One extra row tells whether another page follows
+    rows = query.order_by(sort_key(db, Post.created_at).desc(), Post.post_id.desc()).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+
+# Feed page cache. Every page key embeds the current value of a posts version
+# counter, bumped after any post is created or deleted, so those pages stop
+# being found at once and age out of the cache on their own.
+
+_POSTS_VERSION_KEY = "posts:version"
+_PENDING_PAGE_INVALIDATION = "post_page_invalidation"
+
+
+def invalidate_post_pages(db: Session) -> None:
+    """Invalidate cached feed pages once `db` commits"""
+    db.info[_PENDING_PAGE_INVALIDATION] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_page_invalidation(session: Session) -> None:
+    # Bump only after the change is visible, so a concurrent read can't cache the old page under the new version
+    if session.info.pop(_PENDING_PAGE_INVALIDATION, False):
+        get_cache_backend().incr(_POSTS_VERSION_KEY)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_page_invalidation(session: Session) -> None:
+    session.info.pop(_PENDING_PAGE_INVALIDATION, None)
+
+
+def page_cache_key(
+    limit: int, cursor: Optional[str], keyword: Optional[str], tags: List[str], match: str
+) -> str:
+    """Cache key of a feed page under the current posts version; take it before computing the page"""
+    version = get_cache_backend().get_counters([_POSTS_VERSION_KEY])[0]
+    params = [limit, cursor, keyword, sorted(set(tags)), match]
+    return f"posts:page:{version}:{json.dumps(params, separators=(',', ':'))}"
+
+
+def get_cached_page(key: str) -> Optional[dict]:
+    """A cached page: {"body": serialized JSON, "next_cursor": ..., "etag": ...}, or None"""
+    if not settings.POST_PAGE_CACHE_ENABLED:
+        return None
+    return get_cache_backend().get(key)
+
+
+def cache_page(key: str, body: bytes, next_cursor: Optional[str]) -> dict:
+    """Store a serialized page with its strong ETag and return the cache entry"""
+    page = {
+        "body": body.decode(),
+        "next_cursor": next_cursor,
+        "etag": f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+    }
+    if settings.POST_PAGE_CACHE_ENABLED:
+        get_cache_backend().set(key, page, ttl=settings.POST_PAGE_CACHE_TTL_SECONDS)
+    return page
+
+
+_post_index = InvertedIndex()
+
+
+def _posts_after(db: Session):
+    def load(last_id: int, batch_size: int) -> list:
+        rows = (
+            db.query(Post.post_id, Post.content)
+            .filter(Post.post_id > last_id)
+            .order_by(Post.post_id)
+            .limit(batch_size)
+            .all()
+        )
+        return [(row.post_id, row.content, None) for row in rows]
+    return load
+
+
+_PENDING_UNINDEX = "post_search_removals"
+
+
+def unindex_post(db: Session, post_id: int, content: Optional[str]) -> None:
+    """Drop a deleted post from this process's search index once `db` commits"""
+    db.info.setdefault(_PENDING_UNINDEX, []).append((post_id, content))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_unindex(session: Session) -> None:
+    for post_id, content in session.info.pop(_PENDING_UNINDEX, []):
+        _post_index.remove(post_id, content)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_unindex(session: Session) -> None:
+    session.info.pop(_PENDING_UNINDEX, None)
+
+
+def search_posts(db: Session, query: str, limit: int = 20, offset: int = 0) -> List[dict]:
+    """Posts matching `query`, best match first, each with a highlighted snippet"""
+    if db.get_bind().dialect.name == "postgresql":
+        matches, ts_query = match_search_vector("posts", query)
+        rank = func.ts_rank(literal_column("posts.search_vector"), ts_query)
+        snippet = func.ts_headline(SEARCH_CONFIG, Post.content, ts_query, HEADLINE_OPTIONS)
+        rows = (
+            db.query(*post_columns(), rank.label("rank"), snippet.label("snippet"))
+            .join(User, User.user_id == Post.user_id)
+            .filter(matches)
+            .order_by(rank.desc(), Post.created_at.desc(), Post.post_id.desc())
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+        return [row._asdict() for row in rows]
+
+    _post_index.catch_up(_posts_after(db))
+    page = dict(_post_index.page(
+        _post_index.search(query),
+        offset,
+        limit,
+        lambda post_ids: [post_id for (post_id,) in db.query(Post.post_id).filter(Post.post_id.in_(post_ids))],
+    ))
+    if not page:
+        return []
+    rows = (
+        db.query(*post_columns())
+        .join(User, User.user_id == Post.user_id)
+        .filter(Post.post_id.in_(page))
+        .all()
+    )
+    results = [
+        dict(row._asdict(), rank=page[row.post_id], snippet=highlight(row.content, query)) for row in rows
+    ]
+    results.sort(key=lambda result: (-result["rank"], -result["post_id"]))
+    return results
+
+
+def backfill_post_tags(db: Session, batch_size: int = 1000) -> int:
+    """Fill post_tags from the JSON tags of posts that have no post_tags rows yet"""
+    indexed = exists().where(PostTag.post_id == Post.post_id)
+    created = 0
+    last_id = 0
+    while True:
+        posts = (
+            db.query(Post.post_id, Post.tags, Post.created_at)
+            .filter(Post.post_id > last_id, ~indexed)
+            .order_by(Post.post_id)
+            .limit(batch_size)
+            .all()
+        )
+        if not posts:
+            break
+        rows = [
+            PostTag(post_id=post.post_id, tag=tag, created_at=post.created_at)
+            for post in posts
+            for tag in set(post.tags or [])
+        ]
+        db.add_all(rows)
+        db.commit()
+        created += len(rows)
+        last_id = posts[-1].post_id
+    return created
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain the post_tags index")
+    parser.add_argument(
+        "--backfill-tags", action="store_true", help="Index the tags of posts created before post_tags"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if not args.backfill_tags:
+        parser.print_help()
+        return
+    db = SessionLocal()
+    try:
+        created = backfill_post_tags(db)
+    finally:
+        db.close()
+    logger.info(f"Indexed {created} post tags")
+
+
+if __name__ == "__main__":
+    main()
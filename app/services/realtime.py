@@ -0,0 +1,167 @@
+"""
+Push delivery of new messages to connected clients.
+
+Each uvicorn worker runs one RealtimeHub holding its open WebSocket connections,
+each with a bounded outgoing queue. Events are published through a Broker so
+that every worker sees them and delivers to the connections it holds: the
+default InMemoryBroker only reaches the current process; a shared broker
+(e.g. Redis pub/sub) implements the same interface for multi-worker deployments.
+
+A connection whose queue fills up is a slow consumer. Instead of buffering
+without bound, its queue is replaced by a single "resync" event and the socket
+is closed, so the client reconnects and re-reads history from its last cursor.
+"""
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+Event = Dict[str, Any]
+DeliverCallback = Callable[[List[int], Event], None]
+
+RESYNC_EVENT: Event = {"type": "resync", "reason": "slow_consumer"}
+
+
+class Broker:
+    """Fans published events out to every process's hub."""
+
+    async def start(self, deliver: DeliverCallback) -> None:
+        """Begin passing events published by any process to `deliver`"""
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        raise NotImplementedError
+
+    async def publish(self, user_ids: List[int], event: Event) -> None:
+        raise NotImplementedError
+
+
+class InMemoryBroker(Broker):
+    """Broker for a single process (and tests): publishing delivers straight to subscribed hubs."""
+
+    def __init__(self):
+        self._subscribers: List[DeliverCallback] = []
+
+    async def start(self, deliver: DeliverCallback) -> None:
+        self._subscribers.append(deliver)
+
+    async def stop(self) -> None:
+        self._subscribers.clear()
+
+    async def publish(self, user_ids: List[int], event: Event) -> None:
+        for deliver in list(self._subscribers):
+            deliver(user_ids, event)
+
+
+class Connection:
+    """One client socket's outgoing queue."""
+
+    def __init__(self, user_id: int, queue_size: int):
+        self.user_id = user_id
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False  # Set once the connection fell behind; the writer closes it after the resync event
+
+    def offer(self, event: Event) -> bool:
+        """Queue an event without blocking. Returns False if the connection was dropped as a slow consumer."""
+        if self.dropped:
+            return False
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_EVENT)
+            self.dropped = True
+            return False
+
+
+class RealtimeHub:
+    """Per-process registry of connections, fed by the broker."""
+
+    def __init__(self, broker: Optional[Broker] = None, queue_size: Optional[int] = None):
+        self.broker = broker or InMemoryBroker()
+        self.queue_size = queue_size or settings.REALTIME_QUEUE_SIZE
+        self._connections: Dict[int, Set[Connection]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.dropped_connections = 0
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        await self.broker.start(self.deliver)
+
+    async def stop(self) -> None:
+        await self.broker.stop()
+
+    def set_broker(self, broker: Broker) -> None:
+        """Swap the broker; call before start()"""
+        self.broker = broker
+
+    def connect(self, user_id: int) -> Connection:
+        connection = Connection(user_id, self.queue_size)
+        self._connections.setdefault(user_id, set()).add(connection)
+        return connection
+
+    def disconnect(self, connection: Connection) -> None:
+        connections = self._connections.get(connection.user_id)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self._connections[connection.user_id]
+
+    def connection_count(self) -> int:
+        return sum(len(connections) for connections in self._connections.values())
+
+    def deliver(self, user_ids: Iterable[int], event: Event) -> None:
+        """Queue an event for this process's connections of the given users"""
+        for user_id in set(user_ids):
+            for connection in list(self._connections.get(user_id, ())):
+                if not connection.offer(event) and connection.dropped:
+                    self.dropped_connections += 1
+                    self.disconnect(connection)
+
+    async def publish(self, user_ids: Iterable[int], event: Event) -> None:
+        """Send an event to every connection of the given users, across all workers"""
+        await self.broker.publish(list(user_ids), event)
+
+    def publish_threadsafe(self, user_ids: Iterable[int], event: Event) -> None:
+        """publish() for code running outside the event loop, e.g. background jobs in a thread pool"""
+        if self._loop is None or self._loop.is_closed():
+            return
+        future = asyncio.run_coroutine_threadsafe(self.publish(user_ids, event), self._loop)
+        future.add_done_callback(_log_publish_failure)
+
+
+def _log_publish_failure(future) -> None:
+    if future.exception():
+        logger.error(f"Realtime publish failed: {str(future.exception())}")
+
+
+hub = RealtimeHub()
+
+
+def message_event(message) -> Event:
+    """The event pushed to both participants when a message is stored"""
+    return {
+        "type": "message",
+        "message": {
+            "message_id": message.message_id,
+            "sender_id": message.sender_id,
+            "recipient_id": message.recipient_id,
+            "content": message.content,
+            "conversation_id": message.conversation_id,
+            "is_request": message.is_request,
+            "timestamp": message.timestamp.isoformat() if message.timestamp else None,
+        },
+    }
+
+
+async def publish_message(message) -> None:
+    """Push a committed message to the sender's and recipient's open connections"""
+    try:
+        await hub.publish([message.sender_id, message.recipient_id], message_event(message))
+    except Exception as e:
+        # The message is stored either way; clients catch up from history on reconnect
+        logger.error(f"Realtime publish failed: {str(e)}")
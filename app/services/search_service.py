@@ -0,0 +1,272 @@
+"""
+Full-text search over messages and posts.
+
+On PostgreSQL, messages and posts carry a generated `search_vector` tsvector
+column with a GIN index, created by ensure_search_schema at startup (the column is
+not part of the ORM models so the same models still work on SQLite). Queries are
+parsed with websearch_to_tsquery, ranked with ts_rank and, for posts, highlighted
+with ts_headline.
+
+Other backends (SQLite test runs) use InvertedIndex, a pure-Python index kept
+per process and caught up incrementally from the table on each search.
+"""
+import logging
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, literal_column, or_, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, aliased
+from ..models.messages import Message
+from ..models.users import User
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CONFIG = "english"
+HEADLINE_OPTIONS = "StartSel=<b>, StopSel=</b>, MaxWords=35, MinWords=15"
+
+# Table -> name of the GIN index over its search_vector
+SEARCH_INDEXES = {"messages": "idx_message_search", "posts": "idx_post_search"}
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def ensure_search_schema(engine: Engine) -> None:
+    """Add the tsvector columns and their GIN indexes on PostgreSQL (idempotent)"""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as connection:
+        for table, index in SEARCH_INDEXES.items():
+            connection.execute(text(
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+                f"GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', coalesce(content, ''))) STORED"
+            ))
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {index} ON {table} USING GIN (search_vector)"
+            ))
+
+
+def tokenize(content: str) -> List[str]:
+    return _TOKEN_RE.findall(content.lower())
+
+
+def highlight(content: str, query: str, max_words: int = 35) -> str:
+    """ts_headline-style snippet: a window of `content` around the first match, with matches in <b></b>"""
+    terms = set(tokenize(query))
+    words = content.split()
+    matches = [bool(terms.intersection(tokenize(word))) for word in words]
+    first = matches.index(True) if True in matches else 0
+    start = max(0, min(first - max_words // 3, len(words) - max_words))
+    return " ".join(
+        f"<b>{word}</b>" if matched else word
+        for word, matched in zip(words[start:start + max_words], matches[start:start + max_words])
+    )
+
+
+class InvertedIndex:
+    """
+    Term -> {document id: term frequency} postings with tf-idf ranking.
+
+    Every query term must match (like websearch_to_tsquery's default AND).
+    Deleted documents are removed by their writer (remove) in this process, and
+    by page() in every other process once a search finds them gone.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.lengths: Dict[int, int] = {}
+        self.metadata: Dict[int, Any] = {}  # Per-document data for search filters
+        self.last_id = 0
+        self._lock = threading.Lock()
+
+    def add(self, document_id: int, content: str, metadata: Any = None) -> None:
+        terms = Counter(tokenize(content or ""))
+        with self._lock:
+            for term, count in terms.items():
+                self.postings[term][document_id] = count
+            self.lengths[document_id] = sum(terms.values())
+            self.metadata[document_id] = metadata
+            self.last_id = max(self.last_id, document_id)
+
+    def remove(self, document_id: int, content: Optional[str] = None) -> None:
+        """Drop a document; with its content, its postings go at once, otherwise searches skip them"""
+        with self._lock:
+            self.lengths.pop(document_id, None)
+            self.metadata.pop(document_id, None)
+            for term in set(tokenize(content or "")):
+                self.postings.get(term, {}).pop(document_id, None)
+
+    def catch_up(self, load_after: Callable[[int, int], list], batch_size: int = 5000) -> None:
+        """Index every document stored since the last call.
+
+        `load_after(last_id, batch_size)` returns up to batch_size (id, content, metadata)
+        rows with ids above last_id, in id order.
+        """
+        while True:
+            rows = load_after(self.last_id, batch_size)
+            for row in rows:
+                self.add(*row)
+            if len(rows) < batch_size:
+                return
+
+    def search(self, query: str, accept: Optional[Callable[[Any], bool]] = None) -> List[Tuple[int, float]]:
+        """(document id, score) of documents matching every query term, best first.
+
+        `accept`, if given, is called with a document's metadata to filter it out early.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            postings = [self.postings.get(term, {}) for term in terms]
+            if not all(postings):
+                return []
+            postings.sort(key=len)
+            n_documents = max(len(self.lengths), 1)
+            scores = []
+            for document_id in postings[0]:
+                if document_id not in self.lengths:
+                    continue  # Removed
+                if accept is not None and not accept(self.metadata[document_id]):
+                    continue
+                if not all(document_id in posting for posting in postings[1:]):
+                    continue
+                score = sum(
+                    posting[document_id] / self.lengths[document_id] * math.log(1 + n_documents / len(posting))
+                    for posting in postings
+                )
+                scores.append((document_id, score))
+        # Best score first, newest document first among equals
+        scores.sort(key=lambda item: (-item[1], -item[0]))
+        return scores
+
+    def page(
+        self,
+        matches: List[Tuple[int, float]],
+        offset: int,
+        limit: int,
+        existing: Callable[[List[int]], Iterable[int]],
+    ) -> List[Tuple[int, float]]:
+        """matches[offset:offset + limit], counting only documents still stored.
+
+        `existing(document_ids)` returns the ids that are still in the table; the
+        others were deleted elsewhere and are removed from the index on the way.
+        """
+        kept: List[Tuple[int, float]] = []
+        position = 0
+        while len(kept) < offset + limit and position < len(matches):
+            batch = matches[position:position + offset + limit - len(kept)]
+            position += len(batch)
+            stored = set(existing([document_id for document_id, _ in batch]))
+            for document_id, score in batch:
+                if document_id in stored:
+                    kept.append((document_id, score))
+                else:
+                    self.remove(document_id)
+        return kept[offset:offset + limit]
+
+
+_message_index = InvertedIndex()
+
+
+def match_search_vector(table: str, query: str):
+    """(condition, ts_query) matching a table's search_vector against a websearch-style query, on PostgreSQL"""
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+    return literal_column(f"{table}.search_vector").op("@@")(ts_query), ts_query
+
+
+def _messages_after(db: Session):
+    def load(last_id: int, batch_size: int) -> list:
+        rows = (
+            db.query(Message.message_id, Message.content, Message.sender_id, Message.recipient_id)
+            .filter(Message.message_id > last_id)
+            .order_by(Message.message_id)
+            .limit(batch_size)
+            .all()
+        )
+        return [(row.message_id, row.content, (row.sender_id, row.recipient_id)) for row in rows]
+    return load
+
+
+def _message_columns():
+    sender = aliased(User)
+    recipient = aliased(User)
+    columns = (
+        Message.message_id,
+        Message.sender_id,
+        Message.recipient_id,
+        Message.content,
+        Message.conversation_id,
+        Message.is_request,
+        Message.timestamp,
+        sender.name.label("sender_name"),
+        recipient.name.label("recipient_name"),
+    )
+    return columns, sender, recipient
+
+
+def search_messages(
+    db: Session,
+    user_id: int,
+    query: str,
+    limit: int = 20,
+    offset: int = 0,
+    conversation_id: Optional[str] = None,
+) -> List[dict]:
+    """Messages the user sent or received that match `query`, best match first"""
+    columns, sender, recipient = _message_columns()
+    participant = or_(Message.sender_id == user_id, Message.recipient_id == user_id)
+
+    if db.get_bind().dialect.name == "postgresql":
+        matches, ts_query = match_search_vector("messages", query)
+        rank = func.ts_rank(literal_column("messages.search_vector"), ts_query)
+        rows_query = (
+            db.query(*columns, rank.label("rank"))
+            .join(sender, sender.user_id == Message.sender_id)
+            .join(recipient, recipient.user_id == Message.recipient_id)
+            .filter(matches, participant)
+        )
+        if conversation_id:
+            rows_query = rows_query.filter(Message.conversation_id == conversation_id)
+        rows = (
+            rows_query.order_by(rank.desc(), Message.timestamp.desc(), Message.message_id.desc())
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+        return [row._asdict() for row in rows]
+
+    _message_index.catch_up(_messages_after(db))
+    matches = _message_index.search(query, accept=lambda participants: user_id in participants)
+    if conversation_id:
+        in_conversation = {
+            message_id
+            for (message_id,) in db.query(Message.message_id).filter(
+                Message.conversation_id == conversation_id,
+                Message.message_id.in_([message_id for message_id, _ in matches]),
+            )
+        }
+        matches = [match for match in matches if match[0] in in_conversation]
+    page = dict(_message_index.page(
+        matches,
+        offset,
+        limit,
+        lambda message_ids: [
+            message_id for (message_id,) in db.query(Message.message_id).filter(Message.message_id.in_(message_ids))
+        ],
+    ))
+    if not page:
+        return []
+    rows = (
+        db.query(*columns)
+        .join(sender, sender.user_id == Message.sender_id)
+        .join(recipient, recipient.user_id == Message.recipient_id)
+        .filter(Message.message_id.in_(page), participant)
+        .all()
+    )
+    results = [dict(row._asdict(), rank=page[row.message_id]) for row in rows]
+    results.sort(key=lambda result: (-result["rank"], -result["message_id"]))
+    return results
+
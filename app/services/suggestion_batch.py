@@ -0,0 +1,132 @@
+"""
+Offline batch job that precomputes the top-K suggestions for every user.
+
+Run it from the command line:
+    python -m app.services.suggestion_batch --top-k 50 --workers 4
+
+or in-process on an interval by setting SUGGESTION_BATCH_INTERVAL_MINUTES.
+"""
+import argparse
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import SessionLocal
+from ..models.tag_index import UserTagProfile
+from .similarity_engine import ScoredUser, SimilarityEngine
+from .suggestion_service import persist_suggestions, rebuild_tag_profiles
+
+logger = logging.getLogger(__name__)
+
+# Engine built once per worker process by _init_worker
+_worker_engine: Optional[SimilarityEngine] = None
+
+
+def _init_worker(user_ids: Sequence[int], user_domain_tags: Sequence[Dict[str, List[str]]]) -> None:
+    global _worker_engine
+    _worker_engine = SimilarityEngine(user_ids, user_domain_tags)
+
+
+def _score_chunk(args: Tuple[List[int], int]) -> List[Tuple[int, List[ScoredUser]]]:
+    user_ids, top_k = args
+    return list(_worker_engine.top_k_all(top_k, user_ids=user_ids))
+
+
+def run_suggestion_batch(
+    db: Session,
+    top_k: Optional[int] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = 500,
+) -> int:
+    """Compute and store the top-K suggestions for every user with a tag profile. Returns the number of rows written.
+
+    Users without tags get an empty top-K, which drops whatever was stored for them before.
+    """
+    top_k = top_k or settings.SUGGESTION_TOP_K
+    workers = workers or settings.SUGGESTION_BATCH_WORKERS
+
+    profiles = (
+        db.query(UserTagProfile.user_id, UserTagProfile.domain_tags)
+        .order_by(UserTagProfile.user_id)
+        .all()
+    )
+    user_ids = [user_id for user_id, _ in profiles]
+    user_domain_tags = [domain_tags for _, domain_tags in profiles]
+    chunks = [(user_ids[i:i + chunk_size], top_k) for i in range(0, len(user_ids), chunk_size)]
+    logger.info(f"Computing top-{top_k} suggestions for {len(user_ids)} users in {len(chunks)} chunks")
+
+    written = 0
+    if workers == 1:
+        _init_worker(user_ids, user_domain_tags)
+        for chunk_results in map(_score_chunk, chunks):
+            written += persist_suggestions(db, chunk_results, top_k)
+            db.commit()
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(user_ids, user_domain_tags)
+        ) as executor:
+            for chunk_results in executor.map(_score_chunk, chunks):
+                written += persist_suggestions(db, chunk_results, top_k)
+                db.commit()
+
+    logger.info(f"Stored {written} suggestions for {len(user_ids)} users")
+    return written
+
+
+class SuggestionScheduler:
+    """Runs the suggestion batch on a fixed interval in a background thread."""
+
+    def __init__(self, interval_minutes: int, **batch_options):
+        self.interval_minutes = interval_minutes
+        self.batch_options = batch_options
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="suggestion-batch", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            db = SessionLocal()
+            try:
+                run_suggestion_batch(db, **self.batch_options)
+            except Exception as e:
+                logger.error(f"Suggestion batch failed: {str(e)}")
+            finally:
+                db.close()
+            self._stop.wait(self.interval_minutes * 60)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Precompute top-K suggestions for every user")
+    parser.add_argument("--top-k", type=int, default=settings.SUGGESTION_TOP_K)
+    parser.add_argument("--workers", type=int, default=settings.SUGGESTION_BATCH_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument(
+        "--rebuild-tags",
+        action="store_true",
+        help="Rebuild tag profiles and the inverted tag index from posts and profiles first",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        if args.rebuild_tags:
+            rebuild_tag_profiles(db)
+        run_suggestion_batch(db, args.top_k, args.workers, args.chunk_size)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,31 @@
+from sqlalchemy import event, func, or_
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from collections import Counter
-from typing import List, Dict, Set, Tuple, Optional
+from typing import List, Dict, Set, Tuple, Optional, Iterable
+import heapq
+import json
+import logging
 import math
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from ..config import settings
 from ..models.users import User
 from ..models.profiles import Profile
 from ..models.posts import Post
 from ..models.suggestion import Suggestion
+from ..models.tag_index import UserTag, UserTagProfile
+from .cache import get_cache_backend
+from .minhash_index import get_minhash_index
 
+logger = logging.getLogger(__name__)
 
-# Define domains and their associated tags
+
+# Define domains and their associated tags (the default taxonomy, see DOMAIN_TAXONOMY_PATH)
 DOMAIN_TAGS = {
     "technical": [
         "programming", "coding", "software", "development", "web", "mobile", 
@@ -37,13 +54,90 @@ DOMAIN_TAGS = {
 }
 
 
+class DomainClassifier:
+    """
+    Compiled tag -> domain matcher for a domain taxonomy.
+
+    All keywords are folded into one regex anchored at the start of the tag with
+    one lookahead branch per domain, tried in taxonomy order. The first domain with
+    any keyword anywhere in the tag wins, exactly like a linear scan over the
+    taxonomy, and results are memoized in a bounded LRU cache.
+    """
+
+    def __init__(self, taxonomy: Dict[str, List[str]], cache_size: int = 8192):
+        self.taxonomy = {domain: list(keywords) for domain, keywords in taxonomy.items()}
+        self.domains = list(self.taxonomy.keys())
+        
+        # Domains without keywords can never match, so they get no branch
+        self._branch_domains = [domain for domain, keywords in self.taxonomy.items() if keywords]
+        branches = [
+            "(?=.*?(?:%s))()" % "|".join(re.escape(keyword) for keyword in self.taxonomy[domain])
+            for domain in self._branch_domains
+        ]
+        self._pattern = re.compile("(?:%s)" % "|".join(branches), re.DOTALL) if branches else None
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+
+    def _classify(self, tag: str) -> Optional[str]:
+        if self._pattern is None:
+            return None
+        match = self._pattern.match(tag.lower())
+        return self._branch_domains[match.lastindex - 1] if match else None
+
+
+_classifier = DomainClassifier(DOMAIN_TAGS)
+_taxonomy_mtime: Optional[float] = None
+_taxonomy_checked_at = 0.0
+
+
+def load_domain_taxonomy(path: str) -> Dict[str, List[str]]:
+    """Read a {domain: [keywords]} taxonomy from a JSON file"""
+    with open(path) as taxonomy_file:
+        taxonomy = json.load(taxonomy_file)
+    if not isinstance(taxonomy, dict) or not all(
+        isinstance(keywords, list) and all(isinstance(k, str) for k in keywords)
+        for keywords in taxonomy.values()
+    ):
+        raise ValueError(f"Domain taxonomy in {path} must map domain names to lists of keywords")
+    return taxonomy
+
+
+def set_domain_taxonomy(taxonomy: Dict[str, List[str]]) -> None:
+    """Swap in a new domain taxonomy for this process.
+
+    Stored tag profiles keep the buckets they were built with; run the suggestion
+    batch with --rebuild-tags to re-bucket existing tags under the new taxonomy.
+    """
+    global _classifier
+    _classifier = DomainClassifier(taxonomy)
+    logger.info(f"Loaded domain taxonomy with domains: {', '.join(_classifier.domains)}")
+
+
+def get_domain_classifier() -> DomainClassifier:
+    """Return the active classifier, reloading DOMAIN_TAXONOMY_PATH if the file changed"""
+    global _taxonomy_mtime, _taxonomy_checked_at
+    path = settings.DOMAIN_TAXONOMY_PATH
+    if path:
+        now = time.monotonic()
+        if now - _taxonomy_checked_at >= settings.DOMAIN_TAXONOMY_RELOAD_SECONDS:
+            _taxonomy_checked_at = now
+            try:
+                mtime = os.path.getmtime(path)
+                if mtime != _taxonomy_mtime:
+                    set_domain_taxonomy(load_domain_taxonomy(path))
+                    _taxonomy_mtime = mtime
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to reload domain taxonomy from {path}: {str(e)}")
+    return _classifier
+
+
+def domain_names() -> List[str]:
+    """Names of the domains in the active taxonomy, in matching order"""
+    return get_domain_classifier().domains
+
+
 def identify_domain(tag: str) -> Optional[str]:
     """Identify which domain a tag belongs to"""
-    tag_lower = tag.lower()
-    for domain, tags in DOMAIN_TAGS.items():
-        if any(keyword in tag_lower for keyword in tags):
-            return domain
-    return None
+    return get_domain_classifier().classify(tag)
 
 
 def calculate_tag_similarity(user_tags: List[str], other_tags: List[str]) -> Tuple[float, List[str]]:
@@ -61,36 +155,240 @@ def calculate_tag_similarity(user_tags: List[str], other_tags: List[str]) -> Tup
     return similarity, matching_tags
 
 
-def get_user_tags(db: Session, user_id: int) -> Dict[str, List[str]]:
-    """Collect all tags from a user's posts and profile interests, organized by domain"""
-    all_tags = set()
-    domain_tags = {domain: [] for domain in DOMAIN_TAGS.keys()}
-    domain_tags["other"] = []  # For tags that don't match any domain
+def count_user_tags(db: Session, user_id: int) -> Counter:
+    """Count how many of a user's posts (plus their profile interests) carry each tag"""
+    tag_counts = Counter()
     
     # Get tags from posts
-    posts = db.query(Post).filter(Post.user_id == user_id).all()
-    for post in posts:
-        if post.tags:
-            all_tags.update(post.tags)
+    posts = db.query(Post.tags).filter(Post.user_id == user_id).all()
+    for (tags,) in posts:
+        if tags:
+            tag_counts.update(set(tags))
     
     # Get fields of interest from profile
-    profile = db.query(Profile).filter(Profile.user_id == user_id).first()
+    profile = db.query(Profile.fields_of_interest).filter(Profile.user_id == user_id).first()
     if profile and profile.fields_of_interest:
-        all_tags.update(profile.fields_of_interest)
+        tag_counts.update(set(profile.fields_of_interest))
     
-    # Categorize tags by domain
-    for tag in all_tags:
+    return tag_counts
+
+
+def categorize_tags(tags: Set[str]) -> Dict[str, List[str]]:
+    """Bucket a flat tag set by domain, in the same shape as get_user_tags"""
+    domain_tags = {domain: [] for domain in domain_names()}
+    domain_tags["other"] = []  # For tags that don't match any domain
+    for tag in tags:
         domain = identify_domain(tag)
         if domain:
             domain_tags[domain].append(tag)
         else:
             domain_tags["other"].append(tag)
-    
     return domain_tags
 
 
-def generate_suggestions(db: Session, user_id: int, limit: int = 10) -> List[Tuple[User, float, str, List[str]]]:
-    """Generate user suggestions based on tag similarity across domains"""
+def expand_domain_tags(stored: Optional[Dict[str, List[str]]]) -> Dict[str, List[str]]:
+    """Turn the stored domain buckets of a tag profile into the full get_user_tags shape"""
+    domain_tags = {domain: [] for domain in domain_names()}
+    domain_tags["other"] = []
+    for domain, tags in (stored or {}).items():
+        domain_tags[domain] = list(tags)
+    return domain_tags
+
+
+def get_user_tags(db: Session, user_id: int) -> Dict[str, List[str]]:
+    """Read a user's tags, organized by domain, from their materialized tag profile"""
+    profile = db.query(UserTagProfile.domain_tags).filter(UserTagProfile.user_id == user_id).first()
+    return expand_domain_tags(profile.domain_tags if profile else None)
+
+
+_PENDING_MINHASH_UPDATES = "minhash_index_updates"
+
+
+def update_minhash_index(db: Session, user_id: int, tags: Iterable[str]) -> None:
+    """Put a user's new tag set into the MinHash overlay once `db` commits"""
+    if get_minhash_index() is not None:
+        db.info.setdefault(_PENDING_MINHASH_UPDATES, {})[user_id] = list(tags)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_minhash_updates(session: Session) -> None:
+    # The overlay is process memory, so a rolled-back change must never reach it
+    pending = session.info.pop(_PENDING_MINHASH_UPDATES, None)
+    minhash_index = get_minhash_index()
+    if pending and minhash_index is not None:
+        for user_id, tags in pending.items():
+            minhash_index.insert(user_id, tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_minhash_updates(session: Session) -> None:
+    session.info.pop(_PENDING_MINHASH_UPDATES, None)
+
+
+def update_tag_profile(
+    db: Session,
+    user_id: int,
+    added: Optional[Iterable[str]] = None,
+    removed: Optional[Iterable[str]] = None,
+) -> UserTagProfile:
+    """Incrementally apply tag changes from one post or profile edit to a user's tag profile.
+
+    Each tag in `added`/`removed` counts once, so pass the tags of a single post or the
+    interests of a single profile as given. Tags whose count rises from or falls to zero
+    are added to or removed from the domain buckets and the inverted tag index.
+    A user with no profile row yet (e.g. from before tag profiles) gets one built by
+    rebuild_tag_profile, since a delta alone would miss their earlier tags. Apply the
+    change to the session before calling. The caller commits.
+    """
+    added = set(added or [])
+    removed = set(removed or [])
+    
+    profile = (
+        db.query(UserTagProfile)
+        .filter(UserTagProfile.user_id == user_id)
+        .with_for_update()
+        .first()
+    )
+    if not profile:
+        db.flush()  # rebuild_tag_profile reads the change from the database
+        return rebuild_tag_profile(db, user_id)
+    
+    tag_counts = dict(profile.tag_counts or {})
+    for tag in added:
+        tag_counts[tag] = tag_counts.get(tag, 0) + 1
+    for tag in removed:
+        tag_counts[tag] = tag_counts.get(tag, 0) - 1
+    
+    appeared = {tag for tag in added if tag_counts[tag] > 0 and tag not in (profile.tag_counts or {})}
+    disappeared = {tag for tag in removed if tag_counts[tag] <= 0}
+    for tag in disappeared:
+        del tag_counts[tag]
+    appeared -= disappeared
+    
+    if appeared or disappeared:
+        invalidate_suggestions(db, user_id, set(profile.tag_counts or {}) | set(tag_counts))
+        domain_tags = {domain: set(tags) for domain, tags in (profile.domain_tags or {}).items()}
+        for tag in disappeared:
+            for tags in domain_tags.values():
+                tags.discard(tag)
+        for tag in appeared:
+            domain = identify_domain(tag) or "other"
+            domain_tags.setdefault(domain, set()).add(tag)
+        profile.domain_tags = {domain: sorted(tags) for domain, tags in domain_tags.items() if tags}
+        
+        if disappeared:
+            db.query(UserTag).filter(
+                UserTag.user_id == user_id, UserTag.tag.in_(disappeared)
+            ).delete(synchronize_session=False)
+        for tag in appeared:
+            db.add(UserTag(tag=tag, user_id=user_id))
+    
+    # Reassign rather than mutate so the JSON column is flagged as changed
+    profile.tag_counts = tag_counts
+    profile.tag_count = len(tag_counts)
+    
+    if appeared or disappeared:
+        update_minhash_index(db, user_id, tag_counts.keys())
+    return profile
+
+
+def rebuild_tag_profile(db: Session, user_id: int) -> UserTagProfile:
+    """Recompute a user's tag profile and index rows from their posts and profile. The caller commits."""
+    tag_counts = count_user_tags(db, user_id)
+    
+    profile = db.query(UserTagProfile).filter(UserTagProfile.user_id == user_id).first()
+    if not profile:
+        profile = UserTagProfile(user_id=user_id)
+        db.add(profile)
+    invalidate_suggestions(db, user_id, set(profile.tag_counts or {}) | set(tag_counts))
+    profile.tag_counts = dict(tag_counts)
+    profile.domain_tags = {
+        domain: sorted(tags) for domain, tags in categorize_tags(set(tag_counts)).items() if tags
+    }
+    profile.tag_count = len(tag_counts)
+    
+    indexed_tags = {
+        tag for (tag,) in db.query(UserTag.tag).filter(UserTag.user_id == user_id).all()
+    }
+    stale_tags = indexed_tags - set(tag_counts)
+    if stale_tags:
+        db.query(UserTag).filter(
+            UserTag.user_id == user_id, UserTag.tag.in_(stale_tags)
+        ).delete(synchronize_session=False)
+    for tag in set(tag_counts) - indexed_tags:
+        db.add(UserTag(tag=tag, user_id=user_id))
+    
+    update_minhash_index(db, user_id, tag_counts.keys())
+    return profile
+
+
+def rebuild_tag_profiles(db: Session) -> None:
+    """Rebuild tag profiles and the inverted tag index for every user (backfill for existing data)"""
+    for (user_id,) in db.query(User.user_id).all():
+        rebuild_tag_profile(db, user_id)
+    db.commit()
+
+
+def score_candidate(
+    user_domain_tags: Dict[str, List[str]], other_domain_tags: Dict[str, List[str]]
+) -> Tuple[float, str, List[str]]:
+    """Score one candidate against a user: overall similarity, primary domain and its matching tags"""
+    all_user_tags = []
+    for tags in user_domain_tags.values():
+        all_user_tags.extend(tags)
+    all_other_tags = []
+    for tags in other_domain_tags.values():
+        all_other_tags.extend(tags)
+    
+    # Calculate overall similarity
+    overall_score, matching_tags = calculate_tag_similarity(all_user_tags, all_other_tags)
+    
+    # Calculate domain-specific similarities
+    domain_scores = {}
+    for domain, user_tags in user_domain_tags.items():
+        if user_tags:  # Only consider domains where the user has tags
+            other_tags = other_domain_tags.get(domain, [])
+            domain_score, domain_matching = calculate_tag_similarity(user_tags, other_tags)
+            if domain_score > 0:
+                domain_scores[domain] = (domain_score, domain_matching)
+    
+    # Determine the primary domain of similarity
+    primary_domain = "general"
+    max_score = 0
+    primary_matching = matching_tags
+    
+    for domain, (score, domain_matching) in domain_scores.items():
+        if score > max_score:
+            max_score = score
+            primary_domain = domain
+            primary_matching = domain_matching
+    
+    return overall_score, primary_domain, primary_matching
+
+
+def is_after_cursor(
+    score: float, suggested_user_id: int, after_score: Optional[float], after_user_id: Optional[int]
+) -> bool:
+    """Whether a suggestion ranks strictly after the (score, user id) cursor in suggestion order"""
+    if after_score is None:
+        return True
+    return score < after_score or (score == after_score and suggested_user_id > after_user_id)
+
+
+def generate_suggestions(
+    db: Session,
+    user_id: int,
+    limit: int = 10,
+    after_score: Optional[float] = None,
+    after_user_id: Optional[int] = None,
+) -> List[Tuple[User, float, str, List[str]]]:
+    """Generate user suggestions based on tag similarity across domains.
+
+    Suggestions are ordered by score (highest first), ties broken by ascending user id.
+    Pass the score and user id of the last suggestion of a page as `after_score` and
+    `after_user_id` to get the next page; only the first page is stored.
+    """
+    first_page = after_score is None
     # Get the user's tags by domain
     user_domain_tags = get_user_tags(db, user_id)
     all_user_tags = []
@@ -98,83 +396,373 @@ def generate_suggestions(db: Session, user_id: int, limit: int = 10) -> List[Tup
         all_user_tags.extend(tags)
     
     if not all_user_tags:
+        if first_page:
+            persist_suggestions(db, [(user_id, [])], limit)  # Drop anything stored from before
+            db.commit()
         return []
     
-    # Get all other users
-    other_users = db.query(User).filter(User.user_id != user_id).all()
+    minhash_index = get_minhash_index()
+    if minhash_index is not None:
+        # Approximate: only users whose MinHash signatures collide in some band
+        candidate_ids = [
+            int(candidate_id)
+            for candidate_id in minhash_index.query(all_user_tags, settings.MINHASH_MAX_CANDIDATES)
+            if candidate_id != user_id
+        ]
+    else:
+        # Only users sharing at least one tag can score above zero, so take the
+        # candidates straight from the inverted index instead of scanning everyone
+        candidate_ids = (
+            db.query(UserTag.user_id)
+            .filter(UserTag.tag.in_(all_user_tags), UserTag.user_id != user_id)
+            .distinct()
+        )
+    # One tag profile row per candidate, loaded together with the user
+    candidates = (
+        db.query(User, UserTagProfile.domain_tags)
+        .join(UserTagProfile, UserTagProfile.user_id == User.user_id)
+        .filter(User.user_id.in_(candidate_ids))
+        .order_by(User.user_id)
+        .all()
+    )
     
     # Calculate similarity scores across domains
-    suggestions = []
-    for other_user in other_users:
-        other_domain_tags = get_user_tags(db, other_user.user_id)
-        all_other_tags = []
-        for tags in other_domain_tags.values():
-            all_other_tags.extend(tags)
-        
-        # Calculate overall similarity
-        overall_score, matching_tags = calculate_tag_similarity(all_user_tags, all_other_tags)
-        
-        # Calculate domain-specific similarities
-        domain_scores = {}
-        for domain, user_tags in user_domain_tags.items():
-            if user_tags:  # Only consider domains where the user has tags
-                other_tags = other_domain_tags.get(domain, [])
-                domain_score, domain_matching = calculate_tag_similarity(user_tags, other_tags)
-                if domain_score > 0:
-                    domain_scores[domain] = (domain_score, domain_matching)
-        
-        # Determine the primary domain of similarity
-        primary_domain = "general"
-        max_score = 0
-        primary_matching = matching_tags
-        
-        for domain, (score, domain_matching) in domain_scores.items():
-            if score > max_score:
-                max_score = score
-                primary_domain = domain
-                primary_matching = domain_matching
-        
-        # Only consider users with some similarity
-        if overall_score > 0:
-            suggestions.append((other_user, overall_score, primary_domain, primary_matching))
+    def scored_candidates():
+        for other_user, stored_domain_tags in candidates:
+            overall_score, primary_domain, primary_matching = score_candidate(
+                user_domain_tags, expand_domain_tags(stored_domain_tags)
+            )
+            
+            # Only consider users with some similarity, past the cursor
+            if overall_score > 0 and is_after_cursor(
+                overall_score, other_user.user_id, after_score, after_user_id
+            ):
+                yield other_user, overall_score, primary_domain, primary_matching
     
-    # Sort by similarity score (highest first)
-    suggestions.sort(key=lambda x: x[1], reverse=True)
+    # Keep only the best `limit` in a bounded heap instead of sorting every candidate
+    suggestions = heapq.nsmallest(
+        limit, scored_candidates(), key=lambda s: (-s[1], s[0].user_id)
+    )
     
     # Store suggestions in database
-    for user, score, domain, _ in suggestions[:limit]:
-        existing = db.query(Suggestion).filter(
-            Suggestion.user_id == user_id,
-            Suggestion.suggested_user_id == user.user_id
+    if first_page:
+        persist_suggestions(db, [(
+            user_id,
+            [(user.user_id, score, domain, matching_tags) for user, score, domain, matching_tags in suggestions],
+        )], limit)
+        db.commit()
+    return suggestions
+
+
+def persist_suggestions(
+    db: Session, results: List[Tuple[int, List[Tuple[int, float, str, List[str]]]]], top_k: int
+) -> int:
+    """Store each user's new top-K suggestions and drop the rows that fell out of it.
+
+    `results` holds (user_id, [(suggested_user_id, score, domain, matching_tags), ...]) pairs,
+    each list cut off at `top_k`, which is recorded so readers know whether a list was cut.
+    On PostgreSQL and SQLite this is one batched INSERT ... ON CONFLICT DO UPDATE against
+    idx_user_suggested plus one DELETE for the pruned rows, whatever the number of users.
+    Returns the number of rows written. The caller commits.
+    """
+    user_ids = [user_id for user_id, _ in results]
+    if not user_ids:
+        return 0
+    
+    # Every row written here gets the same timestamp, so anything else stored for
+    # these users is exactly what fell out of their top-K
+    computed_at = datetime.utcnow()
+    rows = [
+        {
+            "user_id": user_id,
+            "suggested_user_id": suggested_user_id,
+            "similarity_score": score,
+            "domain": domain,
+            "matching_tags": matching_tags,
+            "updated_at": computed_at,
+        }
+        for user_id, suggestions in results
+        for suggested_user_id, score, domain, matching_tags in suggestions
+    ]
+    
+    dialect = db.get_bind().dialect.name
+    if rows and dialect in ("postgresql", "sqlite"):
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        stmt = insert(Suggestion.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Suggestion.user_id, Suggestion.suggested_user_id],
+            set_={
+                "similarity_score": stmt.excluded.similarity_score,
+                "domain": stmt.excluded.domain,
+                "matching_tags": stmt.excluded.matching_tags,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        db.execute(stmt, rows)
+    elif rows:
+        # Portable path for other backends: look up existing rows once, then update or add
+        existing = {
+            (s.user_id, s.suggested_user_id): s
+            for s in db.query(Suggestion).filter(Suggestion.user_id.in_(user_ids))
+        }
+        for row in rows:
+            suggestion = existing.get((row["user_id"], row["suggested_user_id"]))
+            if suggestion:
+                for key, value in row.items():
+                    setattr(suggestion, key, value)
+            else:
+                db.add(Suggestion(**row))
+        db.flush()
+    
+    # Rows stored before updated_at existed hold NULL there and are always stale
+    db.query(Suggestion).filter(
+        Suggestion.user_id.in_(user_ids),
+        or_(Suggestion.updated_at.is_(None), Suggestion.updated_at != computed_at),
+    ).delete(synchronize_session=False)
+    # Tells "computed, nothing matched" apart from "never computed" for users with no rows,
+    # and a complete list apart from a cut-off one
+    db.query(UserTagProfile).filter(UserTagProfile.user_id.in_(user_ids)).update(
+        {UserTagProfile.suggestions_computed_at: computed_at, UserTagProfile.suggestions_top_k: top_k},
+        synchronize_session=False,
+    )
+    return len(rows)
+
+
+def get_stored_suggestions(
+    db: Session,
+    user_id: int,
+    limit: int = 10,
+    max_age_minutes: Optional[int] = None,
+    after_score: Optional[float] = None,
+    after_user_id: Optional[int] = None,
+) -> Optional[List[Tuple[User, float, str, List[str]]]]:
+    """Read precomputed suggestions for a user, in the same shape and order as generate_suggestions.
+
+    Returns None when the user has never been computed, or when any stored row or the
+    last computation is older than `max_age_minutes`, so the caller can fall back to
+    generate_suggestions. A user computed with no matches gets an empty list.
+    """
+    query = (
+        db.query(User, Suggestion.similarity_score, Suggestion.domain, Suggestion.matching_tags)
+        .join(User, User.user_id == Suggestion.suggested_user_id)
+        .filter(Suggestion.user_id == user_id)
+    )
+    if after_score is not None:
+        query = query.filter(
+            (Suggestion.similarity_score < after_score)
+            | (
+                (Suggestion.similarity_score == after_score)
+                & (Suggestion.suggested_user_id > after_user_id)
+            )
+        )
+    rows = (
+        query.order_by(Suggestion.similarity_score.desc(), Suggestion.suggested_user_id)
+        .limit(limit)
+        .all()
+    )
+    if not rows:
+        computed = db.query(UserTagProfile.user_id).filter(
+            UserTagProfile.user_id == user_id, UserTagProfile.suggestions_computed_at.isnot(None)
         ).first()
-        
-        if existing:
-            existing.similarity_score = score
-            existing.domain = domain
-        else:
-            db.add(Suggestion(
-                user_id=user_id,
-                suggested_user_id=user.user_id,
-                similarity_score=score,
-                domain=domain
-            ))
+        if not computed and (
+            after_score is None
+            or not db.query(Suggestion.suggestion_id).filter(Suggestion.user_id == user_id).first()
+        ):
+            return None
     
-    db.commit()
-    return suggestions[:limit]
+    if max_age_minutes is not None:
+        cutoff = datetime.utcnow() - timedelta(minutes=max_age_minutes)
+        stale = db.query(Suggestion.suggestion_id).filter(
+            Suggestion.user_id == user_id, Suggestion.updated_at < cutoff
+        ).first() or db.query(UserTagProfile.user_id).filter(
+            UserTagProfile.user_id == user_id, UserTagProfile.suggestions_computed_at < cutoff
+        ).first()
+        if stale:
+            return None
+    
+    return [(user, score, domain, matching_tags or []) for user, score, domain, matching_tags in rows]
+
+
+def get_stored_top_k(db: Session, user_id: int) -> Optional[int]:
+    """K of the user's last stored computation, None if there is none to go by"""
+    return db.query(UserTagProfile.suggestions_top_k).filter(UserTagProfile.user_id == user_id).scalar()
+
+
+def count_stored_suggestions(db: Session, user_id: int) -> int:
+    """Number of suggestions stored for a user"""
+    return db.query(func.count(Suggestion.suggestion_id)).filter(Suggestion.user_id == user_id).scalar()
 
 
 def get_domain_suggestions(db: Session, user_id: int, limit_per_domain: int = 5) -> Dict[str, List[Tuple[User, float, List[str]]]]:
-    """Get suggestions organized by domain"""
-    # Get all suggestions
-    all_suggestions = generate_suggestions(db, user_id, limit=50)  # Get more suggestions to ensure coverage across domains
-    
-    # Organize by domain
-    domain_suggestions = {}
-    for user, score, domain, matching_tags in all_suggestions:
-        if domain not in domain_suggestions:
-            domain_suggestions[domain] = []
-        
-        if len(domain_suggestions[domain]) < limit_per_domain:
-            domain_suggestions[domain].append((user, score, matching_tags))
+    """Get the top suggestions for each domain, keyed by primary domain.
+
+    Each domain is ranked independently over the users sharing a tag with the user in
+    that domain (the only users that can have it as their primary domain), so every
+    domain gets `limit_per_domain` results when enough candidates exist. Nothing is
+    written to the suggestions table.
+    """
+    user_domain_tags = get_user_tags(db, user_id)
+    domain_of_tag = {tag: domain for domain, tags in user_domain_tags.items() for tag in tags}
+    if not domain_of_tag:
+        return {}
+    
+    # Per-domain candidate sets from the inverted tag index, in one query
+    domain_candidates = {domain: set() for domain, tags in user_domain_tags.items() if tags}
+    rows = db.query(UserTag.tag, UserTag.user_id).filter(
+        UserTag.tag.in_(domain_of_tag.keys()), UserTag.user_id != user_id
+    )
+    for tag, other_id in rows:
+        domain_candidates[domain_of_tag[tag]].add(other_id)
+    
+    # Score every candidate once and file them under their primary domain
+    scored = {domain: [] for domain, ids in domain_candidates.items() if ids}
+    if not scored:
+        return {}
+    for other_user, stored_domain_tags in (
+        db.query(User, UserTagProfile.domain_tags)
+        .join(UserTagProfile, UserTagProfile.user_id == User.user_id)
+        .filter(User.user_id.in_(set().union(*domain_candidates.values())))
+    ):
+        score, primary_domain, matching_tags = score_candidate(
+            user_domain_tags, expand_domain_tags(stored_domain_tags)
+        )
+        if score > 0 and other_user.user_id in domain_candidates.get(primary_domain, ()):
+            scored[primary_domain].append((other_user, score, matching_tags))
+    results = {
+        domain: heapq.nsmallest(limit_per_domain, matches, key=lambda s: (-s[1], s[0].user_id))
+        for domain, matches in scored.items()
+    }
+    
+    # Order domains by their best suggestion, as they would appear in the overall ranking
+    ranked_domains = sorted(
+        (domain for domain in results if results[domain]),
+        key=lambda domain: (-results[domain][0][1], results[domain][0][0].user_id),
+    )
+    return {domain: results[domain] for domain in ranked_domains}
+
+
+# Suggestion cache
+#
+# A user's suggestions only change when their own tag set changes or when the tag set
+# of someone sharing a tag with them (before or after the change) does. Every tag set
+# change therefore bumps a version counter for the user and for each tag they had or
+# now have. A cached result records the versions of its user and of that user's tags
+# when it was computed, and is served only while all of them are unchanged.
+
+_PENDING_INVALIDATIONS = "suggestion_cache_invalidations"
+_cache_stats = Counter()  # hits / misses / invalidated, as seen by callers
+
+
+def _user_version_key(user_id: int) -> str:
+    return f"suggestions:version:user:{user_id}"
+
+
+def _tag_version_key(tag: str) -> str:
+    return f"suggestions:version:tag:{tag}"
+
+
+def invalidate_suggestions(db: Session, user_id: int, tags: Iterable[str]) -> None:
+    """Invalidate cached suggestions affected by a change to a user's tag set once `db` commits"""
+    pending = db.info.setdefault(_PENDING_INVALIDATIONS, set())
+    pending.add(_user_version_key(user_id))
+    pending.update(_tag_version_key(tag) for tag in tags)
+
+
+def invalidate_user_suggestions(db: Session, user_id: int) -> None:
+    """Invalidate everything a user's tags may have contributed to, e.g. before deleting them"""
+    tag_counts = db.query(UserTagProfile.tag_counts).filter(UserTagProfile.user_id == user_id).scalar()
+    invalidate_suggestions(db, user_id, tag_counts or {})
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_suggestion_invalidations(session: Session) -> None:
+    # Bump only after the change is visible, so a concurrent read can't cache the old data under new versions
+    pending = session.info.pop(_PENDING_INVALIDATIONS, None)
+    if pending:
+        cache = get_cache_backend()
+        for key in pending:
+            cache.incr(key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_suggestion_invalidations(session: Session) -> None:
+    session.info.pop(_PENDING_INVALIDATIONS, None)
+
+
+def _cached(db: Session, key: str, user_id: int, compute):
+    """Read-through helper: return the cached payload for `key` if still valid, else compute and store it.
+
+    `compute` returns a JSON-serializable payload. Versions are read before computing, so
+    a tag change committed while computing leaves the new entry already invalid.
+    """
+    cache = get_cache_backend()
+    entry = cache.get(key)
+    if entry is not None:
+        if cache.get_counters(entry["version_keys"]) == entry["versions"]:
+            _cache_stats["hits"] += 1
+            return entry["payload"]
+        _cache_stats["invalidated"] += 1
+        cache.delete(key)
+    _cache_stats["misses"] += 1
+    
+    user_tags = db.query(UserTagProfile.tag_counts).filter(UserTagProfile.user_id == user_id).scalar() or {}
+    version_keys = [_user_version_key(user_id)] + [_tag_version_key(tag) for tag in sorted(user_tags)]
+    versions = cache.get_counters(version_keys)
+    payload = compute()
+    cache.set(key, {"version_keys": version_keys, "versions": versions, "payload": payload})
+    return payload
+
+
+def suggestion_cache_stats() -> Dict[str, int]:
+    """Hit, miss and invalidation counts for cached suggestions, plus the backend's own counters"""
+    stats = {f"backend_{name}": value for name, value in get_cache_backend().stats().items()}
+    stats.update({name: _cache_stats[name] for name in ("hits", "misses", "invalidated")})
+    return stats
+
+
+def _load_users(db: Session, user_ids: Iterable[int]) -> Dict[int, User]:
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+    return {user.user_id: user for user in db.query(User).filter(User.user_id.in_(user_ids))}
+
+
+def get_cached_suggestions(db: Session, user_id: int, limit: int = 10) -> List[Tuple[User, float, str, List[str]]]:
+    """First page of generate_suggestions, served from the suggestion cache when still valid"""
+    if not settings.SUGGESTION_CACHE_ENABLED:
+        return generate_suggestions(db, user_id, limit)
+    
+    payload = _cached(db, f"suggestions:{user_id}:{limit}", user_id, lambda: [
+        [user.user_id, score, domain, list(matching_tags)]
+        for user, score, domain, matching_tags in generate_suggestions(db, user_id, limit)
+    ])
+    users = _load_users(db, (suggested_id for suggested_id, _, _, _ in payload))
+    return [
+        (users[suggested_id], score, domain, matching_tags)
+        for suggested_id, score, domain, matching_tags in payload
+        if suggested_id in users
+    ]
+
+
+def get_cached_domain_suggestions(
+    db: Session, user_id: int, limit_per_domain: int = 5
+) -> Dict[str, List[Tuple[User, float, List[str]]]]:
+    """get_domain_suggestions, served from the suggestion cache when still valid"""
+    if not settings.SUGGESTION_CACHE_ENABLED:
+        return get_domain_suggestions(db, user_id, limit_per_domain)
     
-    return domain_suggestions
\ No newline at end of file
+    payload = _cached(db, f"suggestions:by-domain:{user_id}:{limit_per_domain}", user_id, lambda: [
+        [domain, [[user.user_id, score, list(matching_tags)] for user, score, matching_tags in suggestions]]
+        for domain, suggestions in get_domain_suggestions(db, user_id, limit_per_domain).items()
+    ])
+    users = _load_users(db, (suggested_id for _, suggestions in payload for suggested_id, _, _ in suggestions))
+    result = {}
+    for domain, suggestions in payload:
+        bucket = [
+            (users[suggested_id], score, matching_tags)
+            for suggested_id, score, matching_tags in suggestions
+            if suggested_id in users
+        ]
+        if bucket:
+            result[domain] = bucket
+    return result
@@ -7,10 +7,17 @@ from typing import Optional, Dict, Any
 from ..database import get_db
 from ..models.users import User, UserRole, UserStatus
 from ..config import settings
+from ..services.cache import get_cache_backend
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 
+def _active_user_key(email: str) -> str:
+    # email -> user_id of a user that authenticated as active. Kept in the shared
+    # cache backend so invalidate_cached_user reaches every worker using it
+    return f"auth:active:{email}"
+
+
 def create_access_token(
     data: Dict[str, Any], expires_delta: Optional[timedelta] = None
 ) -> str:
@@ -31,30 +38,58 @@ async def get_current_user(
     token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
 ) -> User:
     """Get the current authenticated user from the JWT token."""
-    credentials_exception = HTTPException(
+    return get_user_from_token(token, db)
+
+
+async def get_current_user_id(
+    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+) -> int:
+    """Get the current active user's id, skipping the database for recently seen users."""
+    user_id = get_cache_backend().get(_active_user_key(get_token_email(token)))
+    if user_id is None:
+        user_id = get_user_from_token(token, db).user_id
+    return user_id
+
+
+def invalidate_cached_user(email: str) -> None:
+    """Forget that a user is active, e.g. after deleting them"""
+    get_cache_backend().delete(_active_user_key(email))
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+
+def get_token_email(token: str) -> str:
+    """The email a valid JWT was issued to; raises 401 otherwise."""
     try:
         payload = jwt.decode(
             token, settings.TOKEN_SECRET_KEY, algorithms=[settings.TOKEN_ALGORITHM]
         )
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
+    email: str = payload.get("sub")
+    if email is None:
+        raise _credentials_exception()
+    return email
+
 
+def get_user_from_token(token: str, db: Session) -> User:
+    """Resolve a JWT to an active user, for callers outside the OAuth2 dependency (e.g. WebSockets)."""
+    email = get_token_email(token)
     user = db.query(User).filter(User.email == email).first()
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     if user.status != UserStatus.ACTIVE:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="Account not activated yet"
         )
 
+    get_cache_backend().set(_active_user_key(email), user.user_id, ttl=settings.USER_CACHE_TTL_SECONDS)
     return user
 
 
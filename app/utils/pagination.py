@@ -0,0 +1,60 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Tuple, Type
+from fastapi import HTTPException, status
+from sqlalchemy import DateTime, and_, func, literal, or_
+from sqlalchemy.orm import Session
+
+
+def encode_cursor(*values: Any) -> str:
+    """Pack the sort key of a row into an opaque, URL-safe cursor string."""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode())
+    return encoded.decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: Type) -> Tuple[Any, ...]:
+    """Unpack a cursor made by encode_cursor, converting each value to the given type."""
+    invalid_cursor = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor"
+    )
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(payload, list) or len(payload) != len(types):
+            raise invalid_cursor
+        return tuple(
+            datetime.fromisoformat(value) if value_type is datetime else value_type(value)
+            for value, value_type in zip(payload, types)
+        )
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise invalid_cursor
+
+
+def sort_key(db: Session, column):
+    """`column` as keyset pagination orders and compares it.
+
+    SQLite keeps datetimes as text in two formats (CURRENT_TIMESTAMP has no
+    fractional seconds, SQLAlchemy binds always do), so equal instants don't
+    compare equal there; julianday() puts both on one scale. Other databases
+    use the column as is, and its index.
+    """
+    if db.get_bind().dialect.name == "sqlite" and isinstance(column.type, DateTime):
+        return func.julianday(column)
+    return column
+
+
+def keyset_before(db: Session, sort_column, id_column, sort_value: Any, id_value: int):
+    """Rows ordered before (sort_value, id_value) by (sort_key(sort_column), id_column).
+
+    Spelled out rather than as a row-value comparison so each bind takes its column's type.
+    """
+    key, value = sort_key(db, sort_column), sort_key(db, literal(sort_value, sort_column.type))
+    return or_(key < value, and_(key == value, id_column < id_value))
+
+
+def keyset_after(db: Session, sort_column, id_column, sort_value: Any, id_value: int):
+    """Rows ordered after (sort_value, id_value) by (sort_key(sort_column), id_column)"""
+    key, value = sort_key(db, sort_column), sort_key(db, literal(sort_value, sort_column.type))
+    return or_(key > value, and_(key == value, id_column > id_value))
@@ -0,0 +1,91 @@
+"""
+Benchmark MinHash LSH suggestions against the exact engine.
+
+Builds a synthetic population, takes the exact top-K from SimilarityEngine,
+and reports recall@K and per-query latency of LSH candidate lookup plus exact
+rescoring for a few signature/band configurations.
+
+Usage (from the project root, with the app's .env in place):
+    python -m scripts.bench_minhash --users 100000 --k 10
+"""
+import argparse
+import heapq
+import random
+import tempfile
+import time
+from app.services.minhash_index import MinHashLSH
+from app.services.similarity_engine import SimilarityEngine
+from app.services.suggestion_service import expand_domain_tags, score_candidate
+from scripts.bench_similarity import synthetic_profiles
+
+
+def approximate_top_k(index, user_ids, profiles, row_of, row, k, max_candidates):
+    user_domain_tags = expand_domain_tags(profiles[row])
+    user_tags = [tag for tags in profiles[row].values() for tag in tags]
+    scored = []
+    for candidate in index.query(user_tags, max_candidates):
+        candidate = int(candidate)
+        if candidate == user_ids[row]:
+            continue
+        score, _, _ = score_candidate(user_domain_tags, expand_domain_tags(profiles[row_of[candidate]]))
+        if score > 0:
+            scored.append((candidate, score))
+    return heapq.nsmallest(k, scored, key=lambda s: (-s[1], s[0]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--tags", type=int, default=2_000, help="Vocabulary size")
+    parser.add_argument("--tags-per-user", type=int, default=12)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--max-candidates", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    profiles = synthetic_profiles(args.users, args.tags, args.tags_per_user, args.seed)
+    user_ids = list(range(1, args.users + 1))
+    row_of = {user_id: row for row, user_id in enumerate(user_ids)}
+    tag_sets = [[tag for tags in profile.values() for tag in tags] for profile in profiles]
+
+    engine = SimilarityEngine(user_ids, profiles)
+    sample = random.Random(args.seed).sample(range(args.users), min(args.queries, args.users))
+    exact = {row: engine.top_k(user_ids[row], args.k) for row in sample}
+
+    print(f"{'num_perm':>8} {'bands':>5} {'build':>8} {'recall@' + str(args.k):>10} {'p50':>8} {'p99':>8}")
+    for num_perm, bands in [(64, 16), (128, 32), (128, 64), (256, 128)]:
+        start = time.perf_counter()
+        index = MinHashLSH(num_perm, bands).build(user_ids, tag_sets)
+        build_time = time.perf_counter() - start
+
+        # Round-trip through disk so queries run against the memory-mapped arrays
+        with tempfile.TemporaryDirectory() as path:
+            index.save(path)
+            index = MinHashLSH.load(path)
+
+            hits = total = 0
+            timings = []
+            for row in sample:
+                start = time.perf_counter()
+                approximate = approximate_top_k(index, user_ids, profiles, row_of, row, args.k, args.max_candidates)
+                timings.append(time.perf_counter() - start)
+                # Users tied with the K-th exact score are interchangeable, so a hit is
+                # any approximate result scoring at least that much
+                expected = [score for _, score, _, _ in exact[row]]
+                if expected:
+                    threshold = min(expected)
+                    total += len(expected)
+                    hits += min(len(expected), sum(1 for _, score in approximate if score >= threshold))
+            del index
+
+        timings.sort()
+        recall = hits / total if total else 1.0
+        print(
+            f"{num_perm:>8} {bands:>5} {build_time:>7.1f}s {recall:>10.3f} "
+            f"{timings[len(timings) // 2] * 1000:>6.1f}ms {timings[int(len(timings) * 0.99)] * 1000:>6.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark the sparse similarity engine against the per-pair Python scoring.
+
+Builds a synthetic population of tag profiles, checks that SimilarityEngine
+ranks a sample of users exactly like generate_suggestions does, then times
+one-vs-all scoring and a block of all-vs-all scoring.
+
+Usage (from the project root, with the app's .env in place):
+    python -m scripts.bench_similarity --users 100000
+"""
+import argparse
+import random
+import time
+from app.services.suggestion_service import (
+    DOMAIN_TAGS,
+    categorize_tags,
+    expand_domain_tags,
+    score_candidate,
+)
+from app.services.similarity_engine import SimilarityEngine
+
+
+def synthetic_profiles(n_users: int, vocabulary_size: int, tags_per_user: int, seed: int):
+    rng = random.Random(seed)
+    keywords = [keyword for keywords in DOMAIN_TAGS.values() for keyword in keywords]
+    vocabulary = keywords + [f"topic-{i}" for i in range(max(vocabulary_size - len(keywords), 0))]
+    # Skewed popularity so a few tags are shared by many users, like real interests
+    weights = [1.0 / (rank + 1) ** 0.8 for rank in range(len(vocabulary))]
+    profiles = []
+    for _ in range(n_users):
+        tags = set(rng.choices(vocabulary, weights=weights, k=rng.randint(1, tags_per_user)))
+        profiles.append({d: sorted(t) for d, t in categorize_tags(tags).items() if t})
+    return profiles
+
+
+def reference_top_k(user_ids, profiles, row, k):
+    user_domain_tags = expand_domain_tags(profiles[row])
+    scored = []
+    for other_row, other in enumerate(profiles):
+        if other_row == row:
+            continue
+        score, domain, matching = score_candidate(user_domain_tags, expand_domain_tags(other))
+        if score > 0:
+            scored.append((user_ids[other_row], score, domain, sorted(matching)))
+    scored.sort(key=lambda s: s[1], reverse=True)
+    return scored[:k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--tags", type=int, default=2_000, help="Vocabulary size")
+    parser.add_argument("--tags-per-user", type=int, default=12)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--verify", type=int, default=20, help="Users to check against the reference")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    profiles = synthetic_profiles(args.users, args.tags, args.tags_per_user, args.seed)
+    user_ids = list(range(1, args.users + 1))
+
+    start = time.perf_counter()
+    engine = SimilarityEngine(user_ids, profiles)
+    print(f"build: {time.perf_counter() - start:.3f}s for {args.users} users")
+
+    rng = random.Random(args.seed)
+    sample = rng.sample(range(args.users), min(args.verify, args.users))
+    for row in sample:
+        expected = reference_top_k(user_ids, profiles, row, args.k)
+        actual = engine.top_k(user_ids[row], args.k)
+        if [(u, d, m) for u, _, d, m in expected] != [(u, d, m) for u, _, d, m in actual] or any(
+            e[1] != a[1] for e, a in zip(expected, actual)
+        ):
+            raise SystemExit(f"ranking mismatch for user {user_ids[row]}:\n{expected}\n{actual}")
+    print(f"verified: {len(sample)} users match the reference ranking")
+
+    timings = []
+    for row in sample:
+        start = time.perf_counter()
+        engine.top_k(user_ids[row], args.k)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(
+        f"one-vs-all: median {timings[len(timings) // 2] * 1000:.1f}ms, "
+        f"max {timings[-1] * 1000:.1f}ms"
+    )
+
+    block = user_ids[:256]
+    start = time.perf_counter()
+    for _ in engine.top_k_all(args.k, user_ids=block):
+        pass
+    print(f"all-vs-all: {time.perf_counter() - start:.3f}s for a block of {len(block)} users")
+
+
+if __name__ == "__main__":
+    main()
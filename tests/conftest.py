@@ -0,0 +1,32 @@
+import os
+import tempfile
+
+# Settings are read at import time; point the app at a throwaway SQLite database
+_database_dir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_database_dir, 'test.db')}")
+for name, value in {
+    "ADMIN_EMAIL": "admin@example.com",
+    "EMAIL_SMTP_SERVER": "localhost",
+    "EMAIL_SMTP_PORT": "25",
+    "EMAIL_USERNAME": "test",
+    "EMAIL_PASSWORD": "test",
+    "COLLEGE_ID": "CEK",
+    "TOKEN_SECRET_KEY": "test-secret",
+}.items():
+    os.environ.setdefault(name, value)
+
+import pytest
+
+from app import models  # noqa: F401  (registers every table on Base.metadata)
+from app.database import Base, SessionLocal, engine
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
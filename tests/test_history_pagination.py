@@ -0,0 +1,70 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app.models.conversations import Conversation
+from app.models.messages import Message
+from app.models.users import User, UserRole, UserStatus
+from app.services import archive_service, message_service
+from app.utils.pagination import decode_cursor, encode_cursor
+
+
+def make_user(db, name, role=UserRole.STUDENT):
+    user = User(name=name, email=f"{name}@example.com", role=role, status=UserStatus.ACTIVE)
+    db.add(user)
+    db.commit()
+    return user.user_id
+
+
+def cursor_of(message):
+    # Round-trip through the API cursor format, as a client would send it back
+    return decode_cursor(encode_cursor(message.timestamp, message.message_id), datetime, int)
+
+
+def test_history_pages_through_messages_sent_in_the_same_second(db):
+    student = make_user(db, "student")
+    alumnus = make_user(db, "alumnus", UserRole.ALUMNI)
+    sent = [message_service.send_message(db, student, alumnus, f"m{i}") for i in range(5)]
+    # SQLite stores CURRENT_TIMESTAMP at second resolution; make every timestamp tie the way it does
+    db.execute(text("UPDATE messages SET timestamp = '2024-01-01 12:00:00'"))
+    db.commit()
+    sent = db.query(Message).order_by(Message.message_id).all()
+    conversation = message_service.find_conversation(db, sent[0].conversation_id)
+
+    page, has_more = message_service.get_history(db, conversation, 2)
+    seen = [message.message_id for message in page]
+    while has_more:
+        page, has_more = message_service.get_history(db, conversation, 2, before=cursor_of(page[0]))
+        seen = [message.message_id for message in page] + seen
+    assert seen == [message.message_id for message in sent]
+
+    page, has_more = message_service.get_history(db, conversation, 2, after=cursor_of(sent[1]))
+    assert [message.message_id for message in page] == [sent[2].message_id, sent[3].message_id]
+    assert has_more
+
+
+def test_history_pages_into_the_archive_through_tied_timestamps(db, tmp_path):
+    student = make_user(db, "student")
+    alumnus = make_user(db, "alumnus", UserRole.ALUMNI)
+    for i in range(7):
+        message_service.send_message(db, student, alumnus, f"m{i}")
+    db.execute(text("UPDATE messages SET timestamp = '2020-01-01 12:00:00'"))
+    db.commit()
+    archive_service.set_archive_store(archive_service.LocalArchiveStore(str(tmp_path)))
+    assert archive_service.archive_messages(db, older_than_days=30, chunk_size=2) == (1, 6)
+    conversation = db.query(Conversation).one()
+
+    page, has_more = message_service.get_history(db, conversation, 3)
+    seen = [message.message_id for message in page]
+    while has_more:
+        page, has_more = message_service.get_history(db, conversation, 3, before=cursor_of(page[0]))
+        seen = [message.message_id for message in page] + seen
+    assert seen == list(range(1, 8))
+
+    forward = []
+    page, has_more = message_service.get_history(db, conversation, 2, after=cursor_of(page[0]))
+    forward += [message.message_id for message in page]
+    while has_more:
+        page, has_more = message_service.get_history(db, conversation, 2, after=cursor_of(page[-1]))
+        forward += [message.message_id for message in page]
+    assert forward == list(range(2, 8))
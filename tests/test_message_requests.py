@@ -0,0 +1,34 @@
+import pytest
+
+from app.models.conversations import RequestStatus
+from app.models.users import User, UserRole, UserStatus
+from app.services import message_service
+
+
+def _users(db):
+    student = User(name="student", email="student@example.com", role=UserRole.STUDENT, status=UserStatus.ACTIVE)
+    alumnus = User(name="alumnus", email="alumnus@example.com", role=UserRole.ALUMNI, status=UserStatus.ACTIVE)
+    db.add_all([student, alumnus])
+    db.commit()
+    return student.user_id, alumnus.user_id
+
+
+@pytest.mark.parametrize("batch", [False, True])
+def test_recipient_writing_reopens_a_declined_request(db, batch):
+    student, alumnus = _users(db)
+    message_service.send_message(db, student, alumnus, "hello", is_request=True)
+    conversation = message_service.get_conversation(db, student, alumnus)
+    assert message_service.respond_to_request(db, conversation, alumnus, accept=False)
+    with pytest.raises(PermissionError):
+        message_service.send_message(db, student, alumnus, "again", is_request=True)
+
+    if batch:
+        message_service.send_messages(db, alumnus, [(student, "hi after all", False, None)])
+    else:
+        message_service.send_message(db, alumnus, student, "hi after all")
+
+    db.expire_all()
+    assert message_service.get_conversation(db, student, alumnus).request_status == RequestStatus.ACCEPTED
+    assert message_service.get_pending_request_count(db, alumnus) == 0
+    reply = message_service.send_message(db, student, alumnus, "thanks", is_request=True)
+    assert not reply.is_request
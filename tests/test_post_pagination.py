@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app.models.posts import Post
+from app.models.users import User, UserRole, UserStatus
+from app.services import post_service
+
+
+def test_posts_page_through_posts_created_in_the_same_second(db):
+    author = User(name="author", email="author@example.com", role=UserRole.STUDENT, status=UserStatus.ACTIVE)
+    db.add(author)
+    db.commit()
+    for i in range(4):
+        db.add(Post(user_id=author.user_id, content=f"post {i}", tags=[]))
+    db.commit()
+    # CURRENT_TIMESTAMP has second resolution on SQLite
+    db.execute(text("UPDATE posts SET created_at = '2024-01-01 12:00:00'"))
+    db.commit()
+
+    seen, before = [], None
+    while True:
+        rows, has_more = post_service.get_posts_page(db, 1, before=before)
+        seen += [row.post_id for row in rows]
+        if not has_more:
+            break
+        before = (datetime.fromisoformat(rows[-1].created_at.isoformat()), rows[-1].post_id)
+    assert seen == [4, 3, 2, 1]
@@ -0,0 +1,26 @@
+from app.models.posts import Post
+from app.models.tag_index import UserTag, UserTagProfile
+from app.models.users import User, UserRole, UserStatus
+from app.services import suggestion_service
+
+
+def test_first_update_builds_the_profile_from_existing_posts(db):
+    user = User(name="user", email="user@example.com", role=UserRole.STUDENT, status=UserStatus.ACTIVE)
+    db.add(user)
+    db.commit()
+    # Posts from before the user had a tag profile
+    db.add_all([
+        Post(user_id=user.user_id, content="old", tags=["python", "ml"]),
+        Post(user_id=user.user_id, content="older", tags=["python"]),
+    ])
+    db.commit()
+
+    db.add(Post(user_id=user.user_id, content="new", tags=["python", "music"]))
+    suggestion_service.update_tag_profile(db, user.user_id, added=["python", "music"])
+    db.commit()
+
+    profile = db.query(UserTagProfile).filter(UserTagProfile.user_id == user.user_id).one()
+    assert profile.tag_counts == {"python": 3, "ml": 1, "music": 1}
+    assert profile.tag_count == 3
+    indexed = {tag for (tag,) in db.query(UserTag.tag).filter(UserTag.user_id == user.user_id)}
+    assert indexed == {"python", "ml", "music"}